@@ -0,0 +1,8 @@
+from os import getenv
+
+from com.lab.monitoring.DashboardGroups import group_names, ALL_GROUPS
+from com.lab.monitoring.ModelCheck import check_groups
+
+# Run in CI: builds every dashboard with attrs validation, checks the rendered JSON against the schemas and that it
+# renders the same without validation, which makes TRUSTED_MODELS safe for the production runs.
+check_groups(group_names(getenv("DASHBOARD_GROUP", ALL_GROUPS)))
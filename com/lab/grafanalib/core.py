@@ -1,14 +1,37 @@
 """Overridden Low-level functions for building Grafana dashboards.
 """
-import uuid
+import hashlib
+import threading
 
 import attr
 from attr.validators import instance_of
 from grafanalib.core import Dashboard, Stat, STAT_TYPE
 from grafanalib.core import Evaluator, is_valid_target
 
+ALERT_RULE_UID_LENGTH = 12
 
-@attr.s
+_alert_rule_uids = {}
+_alert_rule_uids_lock = threading.Lock()
+
+
+def alert_rule_uid(dashboard_uid, panel_uid, title, rule_key=None):
+    """Derives a stable alert rule uid from the rule identity, so rules are updated in place between runs.
+
+    The rule key tells apart rules of the same panel with the same title; without one the uid is the same as before
+    rule keys existed. Raises ValueError when two different identities hash to the same uid within one process.
+    """
+    identity = (dashboard_uid or "", panel_uid or "", title or "")
+    if rule_key is not None:
+        identity += (rule_key,)
+    uid = hashlib.sha256("\x1f".join(identity).encode("utf8")).hexdigest()[:ALERT_RULE_UID_LENGTH]
+    with _alert_rule_uids_lock:
+        registered = _alert_rule_uids.setdefault(uid, identity)
+    if registered != identity:
+        raise ValueError(f"Alert rule uid collision [uid: {uid}]: {registered} and {identity}")
+    return uid
+
+
+@attr.s(slots=True)
 class RowPanel(object):
     title = attr.ib(validator=instance_of(str))
     collapsed = attr.ib(default=False, validator=instance_of(bool))
@@ -33,7 +56,7 @@ class RowPanel(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class StatMappingValue(object):
     mapValue = attr.ib(default="", validator=instance_of(str))
     text = attr.ib(default="", validator=instance_of(str))
@@ -53,7 +76,7 @@ class StatMappingValue(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class StatMappingRange(object):
     from_value = attr.ib(validator=instance_of(int))
     to_value = attr.ib(validator=instance_of(int))
@@ -76,7 +99,7 @@ class StatMappingRange(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class StatMappingSpecial(object):
     match = attr.ib(default="", validator=instance_of(str))
     text = attr.ib(default="", validator=instance_of(str))
@@ -97,7 +120,7 @@ class StatMappingSpecial(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class DashboardWrapper(object):
     dashboard = attr.ib(validator=instance_of(Dashboard))
     folderUid = attr.ib(validator=instance_of(str))
@@ -113,7 +136,7 @@ class DashboardWrapper(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class AlertCondition(object):
     target = attr.ib(validator=is_valid_target)
     evaluator = attr.ib(validator=instance_of(Evaluator))
@@ -135,7 +158,7 @@ class AlertCondition(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class PrometheusTarget(object):
     expression = attr.ib(default=None, validator=instance_of(str))
 
@@ -153,7 +176,7 @@ class PrometheusTarget(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class AlertRule(object):
     alertConditions = attr.ib()
     uid = attr.ib(default=None)
@@ -168,18 +191,23 @@ class AlertRule(object):
     openshiftUrl = attr.ib(default=None)
     kibanaUrl = attr.ib(default=None)
     fixGuideUrl = attr.ib(default=None)
+    orgId = attr.ib(default=1, validator=instance_of(int))
+    ruleKey = attr.ib(default=None, validator=attr.validators.optional(instance_of(str)))
 
     def get_uid(self):
         if self.uid is None:
-            self.uid = f"{uuid.uuid4()}".replace("-", "")[:9]
+            self.uid = alert_rule_uid(self.dashboardUid, self.panelUid, self.title, self.ruleKey)
         return self.uid
 
+    def get_rule_group(self):
+        return f"group-{self.folderUid}"
+
     def to_json_data(self):
         json_data = {
             "uid": self.get_uid(),
-            "orgID": 1,
+            "orgID": self.orgId,
             "folderUID": self.folderUid,
-            "ruleGroup": f"group-{self.folderUid}",
+            "ruleGroup": self.get_rule_group(),
             "title": f"[{self.get_uid()}] {self.title}"[:190],
             "condition": "B",
             "data": [
@@ -236,7 +264,7 @@ class AlertRule(object):
         return json_data
 
 
-@attr.s
+@attr.s(slots=True)
 class NotificationPolicyRoute(object):
     receiver = attr.ib(validator=instance_of(str))
     rule_uid = attr.ib(validator=instance_of(str))
@@ -252,7 +280,7 @@ class NotificationPolicyRoute(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class TableOverride(object):
     matcher_id = attr.ib(validator=instance_of(str))
     matcher_options = attr.ib(validator=instance_of(str))
@@ -274,7 +302,7 @@ class TableOverride(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class TransformationGroupBy(object):
     fields = attr.ib(validator=instance_of(list))
 
@@ -290,7 +318,7 @@ class TransformationGroupBy(object):
         return json
 
 
-@attr.s
+@attr.s(slots=True)
 class TransformationField(object):
     name = attr.ib(validator=instance_of(str))
     operation = attr.ib(default=None)
@@ -305,7 +333,7 @@ class TransformationField(object):
         return json
 
 
-@attr.s
+@attr.s(slots=True)
 class TransformationOrganize(object):
     field_names = attr.ib()
 
@@ -323,6 +351,7 @@ class TransformationOrganize(object):
         return json
 
 
+# Not slotted: grafanalib's Stat keeps its attributes in __dict__, so slots would save nothing.
 @attr.s
 class CustomStat(Stat):
     unit = attr.ib(default="none")
@@ -63,7 +63,7 @@ ZABBIX_SEVERITY_COLORS = (
 )
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTargetOptions(object):
     showDisabledItems = attr.ib(default=False, validator=instance_of(bool))
 
@@ -73,7 +73,7 @@ class ZabbixTargetOptions(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTargetField(object):
     filter = attr.ib(default="", validator=instance_of(str))
 
@@ -83,7 +83,7 @@ class ZabbixTargetField(object):
         }
 
 
-@attr.s
+@attr.s(slots=True)
 class ZabbixTarget(object):
     """Generates Zabbix datasource target JSON structure.
 
@@ -0,0 +1,337 @@
+import asyncio
+import time
+
+import aiohttp
+
+from com.lab.grafanalib.core import DashboardWrapper, AlertRule
+from com.lab.monitoring.GrafanaClient import DEFAULT_GRAFANA_HOST, IDEMPOTENT_METHODS, RETRY_STATUS_CODES
+from com.lab.monitoring.MetadataCache import MetadataCache, MetadataResource
+from com.lab.monitoring.RunMetrics import RunMetrics, run_metrics, NO_RESPONSE_STATUS
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model import ZabbixDatasource, AlertRuleGroup, Folder, ContactPoint
+from com.lab.monitoring.model.ResourceIndex import ResourceIndex
+from com.lab.monitoring.model.NotificationPolicyTree import NotificationPolicyTree, PolicyLayout
+from com.lab.monitoring.util.JsonUtil import to_json_data, from_json_data, encode_request_body
+from com.lab.monitoring.util.Util import log_debug, log_info, require_env, log_error, get_env_int, get_env_float, \
+    get_env_enum, summarize_body
+
+
+class AsyncResponse:
+    def __init__(self, status_code: int, content: bytes, headers):
+        self.status_code: int = status_code
+        self.content: bytes = content
+        self.headers = headers
+
+
+def is_retryable_error(method, error: Exception) -> bool:
+    """A request that failed before its connection was established never reached Grafana and is safe to send again;
+    other connection errors may have hit a request Grafana applied, so only idempotent verbs retry them."""
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return True
+    return method in IDEMPOTENT_METHODS and isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class AsyncGrafanaClient:
+    """Asyncio counterpart of GrafanaClient.
+
+    All requests share one aiohttp session whose connection pool and an asyncio semaphore bound the number of requests
+    in flight, so thousands of calls can be scheduled at once without a thread per request. Payloads are serialized
+    with the same to_json_data as GrafanaClient.
+
+    Use it as an async context manager:
+
+        async with AsyncGrafanaClient() as client:
+            await client.save_dashboards(dashboard_wrappers)
+    """
+
+    def __init__(self, grafana_host=DEFAULT_GRAFANA_HOST, grafana_api_key=None, max_concurrency=None, timeout=None,
+                 max_retries=None, backoff_factor=None, gzip_threshold=None,
+                 policy_layout: PolicyLayout = None, metadata_cache: MetadataCache = None, metrics: RunMetrics = None):
+        self.grafana_host = grafana_host
+
+        self.grafana_api_key = grafana_api_key if grafana_api_key is not None else require_env("GRAFANA_API_KEY")
+
+        self.headers = {'Authorization': f"Bearer {self.grafana_api_key}", 'Content-Type': 'application/json'}
+
+        self.max_concurrency = max_concurrency if max_concurrency is not None \
+            else get_env_int("GRAFANA_MAX_CONCURRENCY", 50)
+        self.timeout = timeout if timeout is not None else (get_env_float("GRAFANA_CONNECT_TIMEOUT", 5.0),
+                                                            get_env_float("GRAFANA_READ_TIMEOUT", 60.0))
+        self.max_retries = max_retries if max_retries is not None else get_env_int("GRAFANA_MAX_RETRIES", 3)
+        self.backoff_factor = backoff_factor if backoff_factor is not None \
+            else get_env_float("GRAFANA_RETRY_BACKOFF", 0.5)
+        self.gzip_threshold = gzip_threshold if gzip_threshold is not None \
+            else get_env_int("GRAFANA_GZIP_THRESHOLD", 0)
+        self.policy_layout = policy_layout if policy_layout is not None \
+            else get_env_enum("NOTIFICATION_POLICY_LAYOUT", PolicyLayout, PolicyLayout.FLAT)
+        self.metadata_cache = metadata_cache if metadata_cache is not None else MetadataCache.from_env()
+        self.metrics = metrics if metrics is not None else run_metrics
+
+        self.session = None
+        self.semaphore = None
+
+    async def open(self):
+        if self.session is None:
+            connect_timeout, read_timeout = self.timeout
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout))
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def request(self, method, url, json_data=None, headers=None) -> AsyncResponse:
+        await self.open()
+        with self.metadata_cache.writing(method, url):
+            return await self.send(method, url, json_data, headers)
+
+    async def send(self, method, url, json_data=None, headers=None) -> AsyncResponse:
+        """Sends a request with the retry policy of GrafanaClient: retryable statuses and connection errors of
+        idempotent verbs, and for every verb the errors of connections that were never established."""
+        body, body_headers = encode_request_body(json_data, self.gzip_threshold)
+        headers = dict(headers or {}, **body_headers)
+        bytes_sent = len(body) if body is not None else 0
+        attempt = 0
+        start = time.monotonic()
+        while True:
+            response = None
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, f"{self.grafana_host}/{url}", data=body,
+                                                    headers=headers) as resp:
+                        response = AsyncResponse(resp.status, await resp.read(), resp.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not is_retryable_error(method, e) or attempt >= self.max_retries:
+                    self.metrics.record_request(method, url, NO_RESPONSE_STATUS, time.monotonic() - start,
+                                                bytes_sent, 0, attempt)
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or method not in IDEMPOTENT_METHODS \
+                        or attempt >= self.max_retries:
+                    self.metrics.record_request(method, url, response.status_code, time.monotonic() - start,
+                                                bytes_sent, len(response.content), attempt)
+                    return response
+            await asyncio.sleep(self.retry_delay(attempt, response))
+            attempt += 1
+
+    def retry_delay(self, attempt, response: AsyncResponse = None) -> float:
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+        return self.backoff_factor * (2 ** attempt)
+
+    async def post(self, url, json_data):
+        resp = await self.request("POST", url, json_data)
+        if resp.status_code == 500:
+            log_error("Response: %s - %s", resp.status_code, summarize_body(resp.content))
+        else:
+            log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
+        return resp
+
+    async def delete(self, url):
+        resp = await self.request("DELETE", url)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
+        return resp
+
+    async def get(self, url, headers=None):
+        resp = await self.request("GET", url, headers=headers)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
+        return resp
+
+    async def put(self, url, json_data):
+        resp = await self.request("PUT", url, json_data)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
+        return resp
+
+    async def save_dashboard(self, dashboard_wrapper: DashboardWrapper):
+        log_info(f"Saving dashboard - {dashboard_wrapper.dashboard.title}")
+        with self.metrics.phase("serialize"):
+            json_data = self.to_json_data(dashboard_wrapper)
+        with self.metrics.phase("upload"):
+            resp = await self.post("api/dashboards/db", json_data)
+
+        if resp.status_code == 200:
+            log_info(f"Dashboard uploaded successfully")
+        else:
+            raise ProvisioningException(f"Dashboard uploading failed")
+        return from_json_data(resp.content)
+
+    async def save_dashboards(self, dashboard_wrappers: [DashboardWrapper]):
+        """Uploads all dashboards concurrently. Failed uploads are returned as exceptions in place of the result."""
+        return await asyncio.gather(*[self.save_dashboard(wrapper) for wrapper in dashboard_wrappers],
+                                    return_exceptions=True)
+
+    async def delete_dashboard(self, dashboard_uid):
+        log_info(f"Deleting Dashboard [uid: {dashboard_uid}]")
+        return await self.delete(f"api/dashboards/uid/{dashboard_uid}")
+
+    async def get_metadata(self, resource: MetadataResource):
+        """Returns the cached resource list, revalidating it with a conditional request once its TTL expired."""
+        data = self.metadata_cache.fresh_data(resource)
+        if data is not None:
+            return data
+        entry = self.metadata_cache.entry(resource)
+        resp = await self.get(resource.value, entry.conditional_headers() if entry is not None else None)
+        if resp.status_code == 304 and entry is not None:
+            return self.metadata_cache.touch(resource)
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Metadata fetching failed [{resource.value}]")
+        return self.metadata_cache.store(resource, from_json_data(resp.content), resp.headers.get("ETag"),
+                                         resp.headers.get("Last-Modified"))
+
+    def invalidate_metadata(self, resource: MetadataResource = None):
+        self.metadata_cache.invalidate(resource)
+
+    async def find_datasources(self):
+        log_info("Getting all Datasources")
+        return await self.get_metadata(MetadataResource.DATASOURCES)
+
+    async def find_zabbix_datasource(self) -> [ZabbixDatasource]:
+        datasources = await self.find_datasources()
+        return [ZabbixDatasource.from_json(ds) for ds in datasources if
+                ds['type'] == 'alexanderzobnin-zabbix-datasource']
+
+    async def find_zabbix_datasource_index(self) -> ResourceIndex:
+        datasources = await self.find_datasources()
+        return self.metadata_cache.index(
+            MetadataResource.DATASOURCES, "zabbix", datasources, lambda data: ResourceIndex(
+                [ZabbixDatasource.from_json(ds) for ds in data if ds['type'] == 'alexanderzobnin-zabbix-datasource']))
+
+    async def add_alert_rule(self, alert_rule: AlertRule):
+        log_info(f"Adding Alert Rule [uid: {alert_rule.get_uid()}]")
+        return await self.post("api/v1/provisioning/alert-rules", self.to_json_data(alert_rule))
+
+    async def update_alert_rule(self, alert_rule: AlertRule):
+        log_info(f"Updating Alert Rule [uid: {alert_rule.get_uid()}]")
+        return await self.put(f"api/v1/provisioning/alert-rules/{alert_rule.get_uid()}", self.to_json_data(alert_rule))
+
+    async def upsert_alert_rule(self, alert_rule: AlertRule):
+        resp = await self.update_alert_rule(alert_rule)
+        if resp.status_code == 404:
+            resp = await self.add_alert_rule(alert_rule)
+        return resp
+
+    async def get_alert_rule_group(self, folder_uid, group_title) -> AlertRuleGroup.AlertRuleGroup:
+        resp = await self.get(f"api/v1/provisioning/folder/{folder_uid}/rule-groups/{group_title}")
+        if resp.status_code == 404:
+            return AlertRuleGroup.AlertRuleGroup(folder_uid, group_title)
+        if resp.status_code != 200:
+            raise ProvisioningException(
+                f"Alert rule group fetching failed [folder: {folder_uid}, group: {group_title}]")
+        return AlertRuleGroup.from_json(from_json_data(resp.content))
+
+    async def save_alert_rule_group(self, rule_group: AlertRuleGroup.AlertRuleGroup):
+        log_info(f"Saving Alert Rule Group [folder: {rule_group.folder_uid}, group: {rule_group.title}, "
+                 f"rules: {len(rule_group.rules)}]")
+        resp = await self.put(f"api/v1/provisioning/folder/{rule_group.folder_uid}/rule-groups/{rule_group.title}",
+                              self.to_json_data(rule_group))
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Alert rule group saving failed [group: {rule_group.title}]")
+        return resp
+
+    async def add_alert_rules(self, alert_rules: [AlertRule]):
+        groups = AlertRuleGroup.group_alert_rules(alert_rules)
+        with self.metrics.phase("alert_rules"):
+            await asyncio.gather(*[self.add_alert_rules_to_group(folder_uid, group_title, rules)
+                                   for (folder_uid, group_title), rules in groups.items()])
+
+    async def add_alert_rules_to_group(self, folder_uid, group_title, alert_rules: [AlertRule]):
+        rule_group = await self.get_alert_rule_group(folder_uid, group_title)
+        if rule_group.upsert_rules(alert_rules) == 0:
+            log_info(f"Alert Rule Group unchanged, skipping [folder: {folder_uid}, group: {group_title}]")
+            return
+        await self.save_alert_rule_group(rule_group)
+
+    async def delete_alert_rule(self, alert_rule_uid):
+        log_info(f"Deleting Alert Rule [uid: {alert_rule_uid}]")
+        return await self.delete(f"api/v1/provisioning/alert-rules/{alert_rule_uid}")
+
+    async def find_alert_rules(self):
+        resp = await self.get("api/v1/provisioning/alert-rules")
+        if resp.status_code != 200:
+            raise ProvisioningException("Alert rules fetching failed")
+        return from_json_data(resp.content)
+
+    async def delete_alert_rules(self, alert_rule_uids: [str]):
+        if not alert_rule_uids:
+            return
+        with self.metrics.phase("alert_rules"):
+            groups = AlertRuleGroup.group_rule_uids(await self.find_alert_rules(), set(alert_rule_uids))
+            await asyncio.gather(*[self.delete_alert_rules_from_group(folder_uid, group_title, uids)
+                                   for (folder_uid, group_title), uids in groups.items()])
+
+    async def delete_alert_rules_from_group(self, folder_uid, group_title, alert_rule_uids):
+        rule_group = await self.get_alert_rule_group(folder_uid, group_title)
+        rule_group.remove_rules(alert_rule_uids)
+        await self.save_alert_rule_group(rule_group)
+
+    async def get_notification_policies(self):
+        resp = await self.get("api/v1/provisioning/policies")
+        if resp.status_code != 200:
+            raise ProvisioningException("Notification policies fetching failed")
+        return from_json_data(resp.content)
+
+    async def get_notification_policy_tree(self) -> NotificationPolicyTree:
+        with self.metrics.phase("policies"):
+            return NotificationPolicyTree(await self.get_notification_policies(), self.policy_layout)
+
+    async def save_notification_policy_tree(self, tree: NotificationPolicyTree):
+        if not tree.dirty:
+            log_info("Notification policies unchanged, skipping")
+            return None
+        with self.metrics.phase("policies"):
+            resp = await self.save_notification_policies(tree)
+        if resp.status_code not in (200, 202):
+            raise ProvisioningException(f"Notification policies saving failed")
+        tree.dirty = False
+        return resp
+
+    async def add_notification_policy_routes(self, routes):
+        tree = await self.get_notification_policy_tree()
+        tree.upsert_routes(routes)
+        return await self.save_notification_policy_tree(tree)
+
+    async def migrate_notification_policies(self, layout: PolicyLayout):
+        tree = await self.get_notification_policy_tree()
+        moved = tree.migrate(layout)
+        log_info(f"Migrating {moved} notification policy routes to the {layout.value} layout")
+        return await self.save_notification_policy_tree(tree)
+
+    async def save_notification_policies(self, policies):
+        log_info("Saving notification policies")
+        return await self.put("api/v1/provisioning/policies", self.to_json_data(policies))
+
+    async def delete_policies_and_alert_rules_by_dashboard_uid(self, dashboard_uid):
+        tree = await self.get_notification_policy_tree()
+        alert_rule_uids_to_delete = tree.remove_dashboard(dashboard_uid)
+        await self.save_notification_policy_tree(tree)
+        await self.delete_alert_rules(alert_rule_uids_to_delete)
+
+    async def find_contact_points(self):
+        return await self.get_metadata(MetadataResource.CONTACT_POINTS)
+
+    async def find_contact_point_index(self) -> ResourceIndex:
+        contact_points = await self.find_contact_points()
+        return self.metadata_cache.index(MetadataResource.CONTACT_POINTS, "all", contact_points,
+                                         lambda data: ResourceIndex([ContactPoint.from_json(cp) for cp in data]))
+
+    async def find_folders(self):
+        return await self.get_metadata(MetadataResource.FOLDERS)
+
+    async def find_folder_index(self) -> ResourceIndex:
+        folders = await self.find_folders()
+        return self.metadata_cache.index(MetadataResource.FOLDERS, "all", folders,
+                                         lambda data: ResourceIndex([Folder.from_json(folder) for folder in data]))
+
+    def to_json_data(self, obj, pretty=False) -> str:
+        return to_json_data(obj, pretty)
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from enum import Enum
+from os import getenv
+
+from com.lab.grafanalib.core import DashboardWrapper
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.util.JsonUtil import content_hash, to_canonical_json
+from com.lab.monitoring.util.Util import log_info, log_debug, get_env_enum, target_path
+
+# Fields Grafana assigns on every save, they never describe a content change.
+VOLATILE_DASHBOARD_FIELDS = ("id", "version")
+
+
+class ChangeDetectionMode(Enum):
+    OFF = "off"
+    STATE = "state"
+    REMOTE = "remote"
+
+
+class ChangeDetector:
+    """Decides whether a rendered dashboard differs from what was uploaded before.
+
+    The hash covers the canonical JSON of the dashboard and its folder. In STATE mode it is compared with the hash
+    recorded in a local state file by the previous run, in REMOTE mode with the dashboard currently stored in Grafana.
+    """
+
+    def __init__(self, mode: ChangeDetectionMode, client: GrafanaClient = None, state_file=None):
+        if mode == ChangeDetectionMode.STATE and state_file is None:
+            raise ProvisioningException("State file is required for state based change detection")
+        if mode == ChangeDetectionMode.REMOTE and client is None:
+            raise ProvisioningException("Grafana client is required for remote change detection")
+        self.mode = mode
+        self.client = client
+        self.state_file = state_file
+        self.hashes = self.load_state() if mode == ChangeDetectionMode.STATE else {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_env(client: GrafanaClient, target_name=None):
+        mode = get_env_enum("CHANGE_DETECTION", ChangeDetectionMode, ChangeDetectionMode.OFF)
+        if mode == ChangeDetectionMode.OFF:
+            return None
+        return ChangeDetector(mode, client, target_path(getenv("DASHBOARD_STATE_FILE", ".dashboard-state.json"),
+                                                        target_name))
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, encoding="utf8") as f:
+            return json.load(f)
+
+    def save_state(self):
+        if self.mode != ChangeDetectionMode.STATE:
+            return
+        with self.lock:
+            hashes = dict(self.hashes)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w", encoding="utf8") as f:
+            json.dump(hashes, f, sort_keys=True, indent=2)
+        os.replace(tmp_file, self.state_file)
+        log_info(f"Saved dashboard state for {len(hashes)} dashboards to {self.state_file}")
+
+    def has_changed(self, uid, rendered_hash) -> bool:
+        if uid is None:
+            return True
+        if self.mode == ChangeDetectionMode.REMOTE:
+            previous_hash = self.remote_hash(uid)
+        else:
+            with self.lock:
+                previous_hash = self.hashes.get(uid)
+        log_debug("Dashboard %s hash: rendered %s, previous %s", uid, rendered_hash, previous_hash)
+        return rendered_hash != previous_hash
+
+    def mark_uploaded(self, uid, rendered_hash):
+        if uid is not None and self.mode == ChangeDetectionMode.STATE:
+            with self.lock:
+                self.hashes[uid] = rendered_hash
+
+    def remote_hash(self, dashboard_uid):
+        remote = self.client.get_dashboard(dashboard_uid)
+        if remote is None:
+            return None
+        return hash_dashboard_json(remote["dashboard"], remote.get("meta", {}).get("folderUid", ""))
+
+
+def dashboard_hash(dashboard_wrapper: DashboardWrapper) -> str:
+    dashboard_json = json.loads(to_canonical_json(dashboard_wrapper.dashboard))
+    return hash_dashboard_json(dashboard_json, dashboard_wrapper.folderUid)
+
+
+def hash_dashboard_json(dashboard_json, folder_uid) -> str:
+    content = {key: value for key, value in dashboard_json.items() if key not in VOLATILE_DASHBOARD_FIELDS}
+    return content_hash({"dashboard": content, "folderUid": folder_uid})
@@ -0,0 +1,110 @@
+import importlib
+import sys
+import threading
+import time
+from importlib.metadata import entry_points
+from os import getenv
+
+from com.lab.monitoring.RunMetrics import run_metrics
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+
+ALL_GROUPS = "ALL"
+
+# Distributions can register more groups under this entry point group, e.g. in pyproject.toml:
+#   [project.entry-points."grafana_dashboards.groups"]
+#   PRJ04 = "com.lab.dashboards.prj04"
+ENTRY_POINT_GROUP = "grafana_dashboards.groups"
+
+# Module of each dashboard group. A group module exposes DASHBOARD_BUILDERS, a list of module-level functions without
+# arguments, each returning a DashboardBundle.
+GROUP_MODULES = {
+    "PRJ01": "com.lab.dashboards.prj01",
+    "PRJ02": "com.lab.dashboards.prj02",
+    "PRJ03": "com.lab.dashboards.prj03"
+}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registered_groups() -> dict:
+    """Returns the module path of every known group without importing any group module.
+
+    Groups come from GROUP_MODULES, from entry points of installed distributions and from the DASHBOARD_GROUP_MODULES
+    environment variable (e.g. "PRJ04=com.lab.dashboards.prj04,PRJ05=..."), later sources overriding earlier ones.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = dict(GROUP_MODULES)
+            for entry_point in group_entry_points():
+                registry[entry_point.name] = entry_point.value
+            for item in filter(None, getenv("DASHBOARD_GROUP_MODULES", "").split(",")):
+                name, separator, module_name = item.partition("=")
+                if not separator:
+                    raise ProvisioningException(
+                        f"Environment Variable 'DASHBOARD_GROUP_MODULES' must list NAME=module pairs, got '{item}'")
+                registry[name.strip()] = module_name.strip()
+            _registry = registry
+        return _registry
+
+
+def group_entry_points():
+    # entry_points() only takes a group from Python 3.10 on; before, it returns a dict of all groups.
+    if sys.version_info >= (3, 10):
+        return entry_points(group=ENTRY_POINT_GROUP)
+    return entry_points().get(ENTRY_POINT_GROUP, [])
+
+
+def group_names(dashboard_group) -> [str]:
+    groups = registered_groups()
+    if dashboard_group == ALL_GROUPS:
+        return list(groups)
+    if dashboard_group not in groups:
+        raise ProvisioningException(f"Unknown dashboard group '{dashboard_group}', known groups: {', '.join(groups)}")
+    return [dashboard_group]
+
+
+def load_group(group_name):
+    """Imports the module of the group on first use; the modules of other groups are never imported."""
+    module_name, _, attribute = registered_groups()[group_name].partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+def builder_name(builder) -> str:
+    return f"{builder.__module__}:{builder.__qualname__}"
+
+
+def resolve_builder(name):
+    module_name, qualname = name.split(":")
+    target = importlib.import_module(module_name)
+    for attribute in qualname.split("."):
+        target = getattr(target, attribute)
+    return target
+
+
+def group_builders(group_name) -> list:
+    return list(load_group(group_name).DASHBOARD_BUILDERS)
+
+
+def dashboard_builders(group_name) -> [str]:
+    """Returns the importable names (module:qualname) of the group's dashboard builders."""
+    return [builder_name(builder) for builder in group_builders(group_name)]
+
+
+def build_dashboards(builders) -> [DashboardBundle]:
+    """Builds the bundles and records each build as the render phase of its dashboard.
+
+    The dashboard uid is only known once the builder returned, so the build is timed first and recorded in the
+    dashboard context afterwards.
+    """
+    bundles = []
+    for builder in builders:
+        start = time.monotonic()
+        bundle = builder()
+        with run_metrics.dashboard(bundle.uid, bundle.title):
+            run_metrics.observe_phase("render", time.monotonic() - start)
+        bundles.append(bundle)
+    return bundles
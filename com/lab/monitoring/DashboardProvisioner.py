@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+
+from com.lab.grafanalib.core import DashboardWrapper
+from com.lab.monitoring.ChangeDetector import ChangeDetector, dashboard_hash
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.util.Util import log_info, log_error, get_env_int
+
+
+class ProvisioningStatus(Enum):
+    UPLOADED = "uploaded"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+
+class ProvisioningResult:
+    def __init__(self, title: str, uid: str, status: ProvisioningStatus, duration: float, error: Exception = None):
+        self.title: str = title
+        self.uid: str = uid
+        self.status: ProvisioningStatus = status
+        self.duration: float = duration
+        self.error: Exception = error
+
+
+class DashboardProvisioner:
+    """Renders and uploads dashboards of a group concurrently on a bounded worker pool.
+
+    A failing dashboard does not abort the others: every dashboard gets a ProvisioningResult and the failures are
+    reported together once the whole group has been processed. With a ChangeDetector, dashboards whose rendered JSON
+    did not change since the last upload are skipped, and so are dashboards the interrupted run being resumed from the
+    client's RunJournal already uploaded.
+    """
+
+    def __init__(self, client: GrafanaClient, max_workers=None, change_detector: ChangeDetector = None):
+        self.client = client
+        self.max_workers = max_workers if max_workers is not None else get_env_int("PROVISIONING_WORKERS", 8)
+        self.change_detector = change_detector
+
+    def provision(self, dashboard_wrappers: [DashboardWrapper]) -> [ProvisioningResult]:
+        log_info(f"Provisioning {len(dashboard_wrappers)} dashboards with {self.max_workers} workers")
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.provision_dashboard, wrapper) for wrapper in dashboard_wrappers]
+            for future in as_completed(futures):
+                results.append(future.result())
+        if self.change_detector is not None:
+            self.change_detector.save_state()
+        return results
+
+    def provision_dashboard(self, dashboard_wrapper: DashboardWrapper) -> ProvisioningResult:
+        dashboard = dashboard_wrapper.dashboard
+        with self.client.metrics.dashboard(dashboard.uid, dashboard.title):
+            return self.provision_tracked_dashboard(dashboard_wrapper)
+
+    def provision_tracked_dashboard(self, dashboard_wrapper: DashboardWrapper) -> ProvisioningResult:
+        dashboard = dashboard_wrapper.dashboard
+        start = time.monotonic()
+        try:
+            rendered_hash = None
+            if self.change_detector is not None or self.client.journal is not None:
+                with self.client.metrics.phase("serialize"):
+                    rendered_hash = dashboard_hash(dashboard_wrapper)
+            if self.client.is_step_done("dashboard", dashboard.uid, rendered_hash):
+                log_info(f"Dashboard already uploaded by the interrupted run, skipping - {dashboard.title}")
+                return ProvisioningResult(dashboard.title, dashboard.uid, ProvisioningStatus.SKIPPED,
+                                          time.monotonic() - start)
+            if self.change_detector is not None:
+                if not self.change_detector.has_changed(dashboard.uid, rendered_hash):
+                    log_info(f"Dashboard unchanged, skipping - {dashboard.title}")
+                    return ProvisioningResult(dashboard.title, dashboard.uid, ProvisioningStatus.SKIPPED,
+                                              time.monotonic() - start)
+            self.client.save_dashboard(dashboard_wrapper)
+            self.client.record_step("dashboard", dashboard.uid, rendered_hash)
+            if self.change_detector is not None:
+                self.change_detector.mark_uploaded(dashboard.uid, rendered_hash)
+            return ProvisioningResult(dashboard.title, dashboard.uid, ProvisioningStatus.UPLOADED,
+                                      time.monotonic() - start)
+        except Exception as e:
+            log_error(f"Dashboard provisioning failed - {dashboard.title}: {e}")
+            return ProvisioningResult(dashboard.title, dashboard.uid, ProvisioningStatus.FAILED,
+                                      time.monotonic() - start, e)
+
+    def provision_and_report(self, dashboard_wrappers: [DashboardWrapper]) -> [ProvisioningResult]:
+        results = self.provision(dashboard_wrappers)
+        print_summary(results)
+        failed = [result for result in results if result.status == ProvisioningStatus.FAILED]
+        if failed:
+            raise ProvisioningException(f"{len(failed)} of {len(results)} dashboards failed to provision")
+        return results
+
+
+def print_summary(results: [ProvisioningResult], target_name=None):
+    log_info(f"Provisioning summary of target {target_name}:" if target_name is not None else "Provisioning summary:")
+    for result in sorted(results, key=lambda r: (r.status.value, r.title or "")):
+        line = f"  [{result.status.name}] {result.title} (uid: {result.uid}) - {result.duration:.2f}s"
+        if result.error is not None:
+            line += f" - {result.error}"
+        log_info(line)
+    for status in ProvisioningStatus:
+        count = sum(1 for result in results if result.status == status)
+        log_info(f"  {status.name}: {count}")
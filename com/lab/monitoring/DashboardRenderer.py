@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from com.lab.monitoring.DashboardGroups import dashboard_builders, resolve_builder
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+from com.lab.monitoring.util.JsonUtil import to_json_data, content_hash
+from com.lab.monitoring.util.ModelValidation import apply_model_validation_from_env
+from com.lab.monitoring.util.Util import log_info, log_error
+
+MANIFEST_FILE = "manifest.json"
+
+
+class DashboardRenderer:
+    """Builds dashboards, alert rules and policy routes of dashboard groups and writes their JSON to a directory.
+
+    Nothing is sent to Grafana. Each dashboard builder runs in a worker process, which writes its files as soon as they
+    are rendered; manifest.json lists every file with its content hash, builder and render time.
+
+    Layout of the output directory:
+
+        <group>/dashboards/<dashboard uid>.json
+        <group>/alert-rules/<dashboard uid>.json
+        <group>/policy-routes/<dashboard uid>.json
+        manifest.json
+    """
+
+    def __init__(self, output_dir, max_workers=None):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+
+    def render(self, group_names: [str]):
+        start = time.monotonic()
+        manifest = {"groups": {group_name: {} for group_name in group_names}}
+        failures = []
+        # Workers started with spawn do not inherit the validation setting of this process.
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=apply_model_validation_from_env) as executor:
+            futures = {executor.submit(render_builder, group_name, builder, self.output_dir): (group_name, builder)
+                       for group_name in group_names for builder in dashboard_builders(group_name)}
+            for future in as_completed(futures):
+                group_name, builder = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    log_error(f"Rendering failed - {builder}: {e}")
+                    failures.append(builder)
+                    continue
+                manifest["groups"][group_name][entry["uid"]] = entry
+                log_info(f"Rendered dashboard - {entry['title']} ({entry['render_seconds']:.2f}s)")
+
+        write_json(os.path.join(self.output_dir, MANIFEST_FILE), manifest)
+        rendered = sum(len(dashboards) for dashboards in manifest["groups"].values())
+        log_info(f"Rendered {rendered} dashboards to {self.output_dir} in {time.monotonic() - start:.2f}s")
+        if failures:
+            raise ProvisioningException(f"{len(failures)} dashboard builders failed to render")
+        return manifest
+
+
+def render_builder(group_name, builder, output_dir):
+    """Runs in a worker process: builds one DashboardBundle and writes its files."""
+    start = time.monotonic()
+    bundle = resolve_builder(builder)()
+    if not isinstance(bundle, DashboardBundle):
+        raise ProvisioningException(f"Dashboard builder {builder} must return a DashboardBundle")
+    files = {
+        f"{group_name}/dashboards/{bundle.uid}.json": bundle.dashboard_wrapper,
+        f"{group_name}/alert-rules/{bundle.uid}.json": bundle.alert_rules,
+        f"{group_name}/policy-routes/{bundle.uid}.json": bundle.notification_policy_routes
+    }
+    hashes = {}
+    for path, obj in files.items():
+        hashes[path] = write_rendered(output_dir, path, obj)
+    return {
+        "uid": bundle.uid,
+        "title": bundle.title,
+        "builder": builder,
+        "files": hashes,
+        "render_seconds": round(time.monotonic() - start, 6)
+    }
+
+
+def write_rendered(output_dir, path, obj) -> str:
+    """Writes obj pretty-printed for review diffs and returns the hash of its canonical JSON."""
+    full_path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w", encoding="utf8") as f:
+        f.write(to_json_data(obj, pretty=True))
+    return content_hash(obj)
+
+
+def write_json(path, obj):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(obj, f, sort_keys=True, indent=2)
@@ -0,0 +1,250 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote
+
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model import AlertRuleGroup
+from com.lab.monitoring.model.RenderedBundle import RenderedDashboardWrapper
+from com.lab.monitoring.util.JsonUtil import from_json_data
+from com.lab.monitoring.util.Util import log_info, log_error
+
+ARCHIVE_VERSION = 1
+INDEX_FILE = "index.json"
+
+# Members are written and restored in this order, so folders and contact points exist before the dashboards, rule
+# groups and policies referencing them.
+FOLDERS = "folders"
+CONTACT_POINTS = "contact-points"
+DASHBOARDS = "dashboards"
+ALERT_RULES = "alert-rules"
+POLICIES = "policies"
+
+RESTORE_MESSAGE = "Restored from backup"
+
+
+class GrafanaBackup:
+    """Exports the dashboards and alerting configuration of a Grafana instance to a tar.gz archive and restores them.
+
+    Dashboards are listed page by page from the dashboard search; dashboards and alert rule groups are fetched, and
+    all objects restored, on a worker pool with at most two requests per worker in flight. Objects go to and come from
+    the archive one at a time, so memory is bounded by the number of requests in flight, not by the size of the
+    instance. The index, written last, lists every member with its kind, key, size and sha256; restore checks the
+    archive against it.
+
+    Archive layout:
+
+        folders/<uid>.json
+        contact-points/<uid>.json
+        dashboards/<uid>.json                       (as returned by api/dashboards/uid, with its meta)
+        alert-rules/<folder uid>/<group title>.json
+        policies/policies.json
+        index.json
+    """
+
+    def __init__(self, client: GrafanaClient, max_workers=8, page_size=1000):
+        self.client = client
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def export(self, archive_file) -> dict:
+        start = time.monotonic()
+        entries = []
+        tmp_file = f"{archive_file}.tmp"
+        with tarfile.open(tmp_file, "w:gz") as archive, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def add(kind, key, content: bytes):
+                path = f"{kind}/{'/'.join(quote(part, safe='') for part in key.split('/'))}.json"
+                add_member(archive, path, content)
+                entries.append({"path": path, "kind": kind, "key": key, "bytes": len(content),
+                                "sha256": hashlib.sha256(content).hexdigest()})
+
+            for folder in self.client.iter_folders(self.page_size):
+                add(FOLDERS, folder["uid"], encode(folder))
+            resp, contact_points = self.client.get_json("api/v1/provisioning/contact-points")
+            if resp.status_code != 200:
+                raise ProvisioningException("Contact point fetching failed")
+            for contact_point in contact_points:
+                add(CONTACT_POINTS, contact_point["uid"], encode(contact_point))
+
+            window = TaskWindow(executor, self.max_workers * 2)
+            for uid, content in window.map(self.fetch_dashboard, self.client.iter_dashboard_uids(self.page_size)):
+                if content is not None:
+                    add(DASHBOARDS, uid, content)
+            for (folder_uid, group_title), content in window.map(self.fetch_rule_group, self.rule_group_keys()):
+                add(ALERT_RULES, f"{folder_uid}/{group_title}", content)
+            add(POLICIES, "policies", self.fetch("api/v1/provisioning/policies"))
+
+            index = {
+                "version": ARCHIVE_VERSION,
+                "grafana_host": self.client.grafana_host,
+                "exported_at": time.time(),
+                "counts": count_kinds(entries),
+                "entries": entries
+            }
+            add_member(archive, INDEX_FILE, json.dumps(index, sort_keys=True, indent=2).encode("utf8"))
+        os.replace(tmp_file, archive_file)
+        log_info(f"Exported {len(entries)} objects {index['counts']} to {archive_file} "
+                 f"in {time.monotonic() - start:.2f}s")
+        return index
+
+    def rule_group_keys(self) -> list:
+        """Returns the (folder uid, group title) of every alert rule group, the rules themselves are not kept."""
+        return sorted({(rule["folderUID"], rule["ruleGroup"]) for rule in self.client.find_alert_rules()})
+
+    def fetch(self, url) -> bytes:
+        resp = self.client.get(url)
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Backup fetching failed [{url}]")
+        return resp.content
+
+    def fetch_dashboard(self, dashboard_uid):
+        resp = self.client.get(f"api/dashboards/uid/{dashboard_uid}")
+        if resp.status_code == 404:
+            log_info(f"Dashboard deleted during the export, skipping [uid: {dashboard_uid}]")
+            return dashboard_uid, None
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Dashboard fetching failed [uid: {dashboard_uid}]")
+        return dashboard_uid, resp.content
+
+    def fetch_rule_group(self, key):
+        folder_uid, group_title = key
+        return key, self.fetch(f"api/v1/provisioning/folder/{folder_uid}/rule-groups/{quote(group_title, safe='')}")
+
+    def restore(self, archive_file):
+        """Uploads every object of the archive, overwriting dashboards, rule groups and policies of the same uid.
+
+        Existing folders and contact points are kept: Grafana redacts the secrets of contact points when they are
+        read, so restoring them over existing ones would break them. Fails after the whole archive was processed if an
+        upload failed or the archive does not match its index.
+        """
+        start = time.monotonic()
+        digests = {}
+        failures = []
+        skipped = 0
+        index = None
+        with tarfile.open(archive_file, "r|gz") as archive, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            window = TaskWindow(executor, self.max_workers * 2, failures)
+            existing_contact_points = {contact_point["uid"] for contact_point in self.client.find_contact_points()}
+            current_kind = None
+            for member in archive:
+                if not member.isfile():
+                    continue
+                content = archive.extractfile(member).read()
+                if member.name == INDEX_FILE:
+                    index = json.loads(content)
+                    continue
+                digests[member.name] = hashlib.sha256(content).hexdigest()
+                kind = member.name.split("/")[0]
+                if kind != current_kind:
+                    # Objects of a kind may reference those of the previous kinds, which must be uploaded first.
+                    window.drain()
+                    current_kind = kind
+                if kind == CONTACT_POINTS and from_json_data(content)["uid"] in existing_contact_points:
+                    skipped += 1
+                    continue
+                window.submit(self.restore_object, kind, member.name, content)
+            window.drain()
+        mismatches = verify_index(index, digests)
+        log_info(f"Restored {len(digests) - len(failures) - skipped} of {len(digests)} objects from {archive_file} "
+                 f"in {time.monotonic() - start:.2f}s, {skipped} existing contact points kept")
+        if failures or mismatches:
+            raise ProvisioningException(f"Restore of {archive_file} failed: {len(failures)} uploads failed, "
+                                        f"{len(mismatches)} objects do not match the index")
+
+    def restore_object(self, kind, path, content: bytes):
+        data = from_json_data(content)
+        if kind == FOLDERS:
+            self.client.save_folder(data["uid"], data["title"])
+        elif kind == CONTACT_POINTS:
+            self.client.add_contact_point(data)
+        elif kind == DASHBOARDS:
+            dashboard = dict(data["dashboard"], id=None)
+            self.client.save_dashboard(RenderedDashboardWrapper({
+                "dashboard": dashboard,
+                "folderUid": data.get("meta", {}).get("folderUid", ""),
+                "overwrite": True,
+                "message": RESTORE_MESSAGE
+            }))
+        elif kind == ALERT_RULES:
+            self.client.save_alert_rule_group(AlertRuleGroup.from_json(data))
+        elif kind == POLICIES:
+            resp = self.client.save_notification_policies(data)
+            if resp.status_code not in (200, 202):
+                raise ProvisioningException("Notification policies saving failed")
+        else:
+            raise ProvisioningException(f"Unknown backup member {path}")
+
+
+class TaskWindow:
+    """Runs tasks on an executor with at most size of them in flight.
+
+    Tasks of submit() that fail are logged and their errors collected in failures; map() yields results in completion
+    order and raises the first error.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, size, failures: list = None):
+        self.executor = executor
+        self.size = size
+        self.failures = failures if failures is not None else []
+        self.pending = set()
+
+    def submit(self, fn, *args):
+        while len(self.pending) >= self.size:
+            self.collect(wait(self.pending, return_when=FIRST_COMPLETED).done)
+        self.pending.add(self.executor.submit(fn, *args))
+
+    def drain(self):
+        self.collect(wait(self.pending).done)
+
+    def collect(self, done):
+        for future in done:
+            self.pending.discard(future)
+            if future.exception() is not None:
+                log_error(f"Backup task failed: {future.exception()}")
+                self.failures.append(future.exception())
+
+    def map(self, fn, items):
+        pending = set()
+        for item in items:
+            if len(pending) >= self.size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(self.executor.submit(fn, item))
+        for future in wait(pending).done:
+            yield future.result()
+
+
+def encode(obj) -> bytes:
+    return json.dumps(obj, sort_keys=True).encode("utf8")
+
+
+def add_member(archive: tarfile.TarFile, path, content: bytes):
+    info = tarfile.TarInfo(path)
+    info.size = len(content)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(content))
+
+
+def count_kinds(entries) -> dict:
+    counts = {}
+    for entry in entries:
+        counts[entry["kind"]] = counts.get(entry["kind"], 0) + 1
+    return counts
+
+
+def verify_index(index, digests: dict) -> [str]:
+    """Returns the paths whose content differs from, or is missing in, the index of the archive."""
+    if index is None:
+        raise ProvisioningException("Backup archive has no index, it is incomplete")
+    expected = {entry["path"]: entry["sha256"] for entry in index["entries"]}
+    mismatches = sorted(path for path in expected.keys() | digests.keys() if expected.get(path) != digests.get(path))
+    for path in mismatches:
+        log_error(f"Backup member does not match the index: {path}")
+    return mismatches
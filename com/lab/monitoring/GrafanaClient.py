@@ -1,123 +1,546 @@
-import json
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from os import getenv
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from urllib3.util.retry import Retry
 
-from grafanalib._gen import DashboardEncoder
 from com.lab.grafanalib.core import DashboardWrapper, AlertRule
+from com.lab.monitoring.MetadataCache import MetadataCache, MetadataResource
+from com.lab.monitoring.RequestScheduler import RequestScheduler
+from com.lab.monitoring.RunJournal import RunJournal
+from com.lab.monitoring.RunMetrics import RunMetrics, run_metrics, endpoint_template
 from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
-from com.lab.monitoring.model import ZabbixDatasource
-from com.lab.monitoring.util.Util import log_debug, log_info, require_env, log_error
+from com.lab.monitoring.model import ZabbixDatasource, AlertRuleGroup, Folder, ContactPoint
+from com.lab.monitoring.model.ResourceIndex import ResourceIndex
+from com.lab.monitoring.model.NotificationPolicyTree import NotificationPolicyTree, PolicyLayout, get_matcher_value
+from com.lab.monitoring.util.JsonUtil import to_json_data, from_json_data, encode_request_body, StreamedBody, \
+    load_json_stream, STREAM_CHUNK_SIZE, content_hash
+from com.lab.monitoring.util.Util import log_debug, log_info, require_env, log_error, get_env_int, get_env_float, \
+    get_env_enum, summarize_body
+
+DEFAULT_GRAFANA_HOST = "https://your-grafana-ip"
+
+# Only verbs that can be safely replayed are retried on error responses and broken connections. Connections that could
+# not be established are retried for every verb, because the request has not reached Grafana yet.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUS_CODES = (429, 502, 503, 504)
 
 
 class GrafanaClient:
 
-    def __init__(self):
-        self.grafana_host = "https://your-grafana-ip"
+    def __init__(self, grafana_host=DEFAULT_GRAFANA_HOST, grafana_api_key=None, pool_size=None, timeout=None,
+                 max_retries=None, backoff_factor=None, gzip_threshold=None,
+                 policy_layout: PolicyLayout = None, metadata_cache: MetadataCache = None, metrics: RunMetrics = None,
+                 streaming=None, scheduler: RequestScheduler = None, journal: RunJournal = None, org_id=None):
+        self.grafana_host = grafana_host
 
-        self.grafana_api_key = require_env("GRAFANA_API_KEY")
+        self.grafana_api_key = grafana_api_key if grafana_api_key is not None else require_env("GRAFANA_API_KEY")
 
         self.headers = {'Authorization': f"Bearer {self.grafana_api_key}", 'Content-Type': 'application/json'}
+        # Selects the organization for users of several orgs; API keys and service accounts belong to a single one.
+        self.org_id = org_id
+        if org_id is not None:
+            self.headers['X-Grafana-Org-Id'] = str(org_id)
+
+        self.pool_size = pool_size if pool_size is not None else get_env_int("GRAFANA_POOL_SIZE", 10)
+        self.timeout = timeout if timeout is not None else (get_env_float("GRAFANA_CONNECT_TIMEOUT", 5.0),
+                                                            get_env_float("GRAFANA_READ_TIMEOUT", 60.0))
+        self.max_retries = max_retries if max_retries is not None else get_env_int("GRAFANA_MAX_RETRIES", 3)
+        self.backoff_factor = backoff_factor if backoff_factor is not None \
+            else get_env_float("GRAFANA_RETRY_BACKOFF", 0.5)
+        self.gzip_threshold = gzip_threshold if gzip_threshold is not None \
+            else get_env_int("GRAFANA_GZIP_THRESHOLD", 0)
+        self.policy_layout = policy_layout if policy_layout is not None \
+            else get_env_enum("NOTIFICATION_POLICY_LAYOUT", PolicyLayout, PolicyLayout.FLAT)
+        self.metadata_cache = metadata_cache if metadata_cache is not None else MetadataCache.from_env()
+        self.metrics = metrics if metrics is not None else run_metrics
+        self.streaming = streaming if streaming is not None \
+            else getenv("GRAFANA_STREAMING", "False").lower() == "true"
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.from_env(self.pool_size)
+        if self.scheduler is not None:
+            self.metrics.register_scheduler(self.grafana_host, self.scheduler)
+        self.journal = journal
+
+        self.session = self.create_session()
+
+    def create_session(self):
+        # With a scheduler every attempt has to wait for it, so requests are retried by send() instead of urllib3.
+        retry = Retry(total=self.max_retries if self.scheduler is None else 0,
+                      backoff_factor=self.backoff_factor,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=IDEMPOTENT_METHODS,
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True, max_retries=retry)
+
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.verify = True
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        if self.scheduler is not None:
+            self.scheduler.log_summary()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def step_inputs(self, obj):
+        """Returns the hash identifying the inputs of a journaled step, None without a run journal."""
+        return content_hash(obj) if self.journal is not None else None
+
+    def is_step_done(self, step, key, inputs=None) -> bool:
+        return self.journal is not None and self.journal.is_done(step, key, inputs)
+
+    def step_result(self, step, key, inputs=None):
+        return self.journal.result(step, key, inputs) if self.journal is not None else None
+
+    def record_step(self, step, key, inputs=None, result=None):
+        if self.journal is not None:
+            self.journal.record(step, key, inputs, result)
+
+    def request(self, method, url, json_data=None, headers=None):
+        with self.metadata_cache.writing(method, url):
+            if isinstance(json_data, StreamedBody):
+                return self.request_streamed(method, url, json_data, headers)
+            body, body_headers = encode_request_body(json_data, self.gzip_threshold)
+            headers = dict(headers or {}, **body_headers)
+            start = time.monotonic()
+            resp, retries = self.send(method, url, data=body, headers=headers)
+            self.metrics.record_request(method, url, resp.status_code, time.monotonic() - start,
+                                        len(body) if body is not None else 0, len(resp.content), retries)
+            return resp
+
+    def request_streamed(self, method, url, body: StreamedBody, headers=None):
+        """Sends body with chunked transfer encoding, encoding it again for every attempt."""
+        headers = dict(headers or {}, **body.headers)
+        start = time.monotonic()
+        resp, retries = self.send(method, url, data=body, headers=headers)
+        self.metrics.record_request(method, url, resp.status_code, time.monotonic() - start, body.bytes_sent,
+                                    len(resp.content), retries)
+        return resp
+
+    def send(self, method, url, **kwargs):
+        """Sends a request and returns the response and the number of retries.
+
+        Plain requests are retried by the urllib3 retries of the session. requests does not apply those to chunked
+        bodies, and with a scheduler every attempt has to wait for a slot, so these are retried here with the same
+        policy: retryable statuses and connection errors of idempotent verbs, and for every verb the errors of
+        connections that were never established, honoring Retry-After.
+        """
+        if self.scheduler is None and not isinstance(kwargs.get("data"), StreamedBody):
+            resp = self.session.request(method, f"{self.grafana_host}/{url}", timeout=self.timeout, **kwargs)
+            return resp, retry_count(resp)
+        attempt = 0
+        while True:
+            try:
+                resp = self.send_once(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if (method not in IDEMPOTENT_METHODS and not is_connect_error(e)) or attempt >= self.max_retries:
+                    raise
+                resp = None
+            if resp is not None and (method not in IDEMPOTENT_METHODS or resp.status_code not in RETRY_STATUS_CODES
+                                     or attempt >= self.max_retries):
+                return resp, attempt
+            if resp is not None:
+                # Reading the error body of a streamed response returns its connection to the pool.
+                resp.content
+            attempt += 1
+            time.sleep(retry_delay(resp, self.backoff_factor, attempt))
+
+    def send_once(self, method, url, **kwargs):
+        if self.scheduler is None:
+            return self.session.request(method, f"{self.grafana_host}/{url}", timeout=self.timeout, **kwargs)
+        with self.scheduler.slot(method, endpoint_template(url)) as slot:
+            resp = self.session.request(method, f"{self.grafana_host}/{url}", timeout=self.timeout, **kwargs)
+            slot.complete(resp.status_code, retry_after_seconds(resp), body_size(kwargs.get("data")))
+        return resp
+
+    def request_body(self, obj):
+        """Returns the body to upload obj with: streamed while it is encoded, or encoded up front."""
+        if self.streaming:
+            return StreamedBody(obj, self.gzip_threshold > 0)
+        return self.to_json_data(obj)
+
+    def get_json(self, url, headers=None):
+        """GETs a JSON document and returns the response and the decoded body (None unless the status is 200).
+
+        When streaming, the body is decoded incrementally as it arrives instead of being read into memory first.
+        """
+        if not self.streaming:
+            resp = self.get(url, headers)
+            return resp, from_json_data(resp.content) if resp.status_code == 200 else None
+        start = time.monotonic()
+        resp, retries = self.send("GET", url, headers=headers, stream=True)
+        with resp:
+            counter = ByteCounter(resp.iter_content(STREAM_CHUNK_SIZE))
+            data = load_json_stream(counter) if resp.status_code == 200 else None
+            if data is None:
+                counter.count += len(resp.content)
+        self.metrics.record_request("GET", url, resp.status_code, time.monotonic() - start, 0, counter.count,
+                                    retries)
+        log_debug("Response: %s - streamed %s bytes", resp.status_code, counter.count)
+        return resp, data
 
     def post(self, url, json_data):
-        resp = requests.post(f"{self.grafana_host}/{url}", data=json_data, headers=self.headers, verify=True)
-        if resp.status_code == 500:
-            log_error(f"Response: {resp.status_code} - {resp.content}")
+        resp = self.request("POST", url, json_data)
+        if resp.status_code >= 500 or resp.status_code == 429:
+            log_error("Response: %s - %s", resp.status_code, summarize_body(resp.content))
         else:
-            log_debug(f"Response: {resp.status_code} - {resp.content}")
+            log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
         return resp
 
     def delete(self, url):
-        resp = requests.delete(f"{self.grafana_host}/{url}", headers=self.headers, verify=True)
-        log_debug(f"Response: {resp.status_code} - {resp.content}")
+        resp = self.request("DELETE", url)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
         return resp
 
-    def get(self, url):
-        resp = requests.get(f"{self.grafana_host}/{url}", headers=self.headers, verify=True)
-        log_debug(f"Response: {resp.status_code} - {resp.content}")
+    def get(self, url, headers=None):
+        resp = self.request("GET", url, headers=headers)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
         return resp
 
     def put(self, url, json_data):
-        resp = requests.put(f"{self.grafana_host}/{url}", data=json_data, headers=self.headers, verify=True)
-        log_debug(f"Response: {resp.status_code} - {resp.content}")
+        resp = self.request("PUT", url, json_data)
+        log_debug("Response: %s - %s", resp.status_code, summarize_body(resp.content))
         return resp
 
     def save_dashboard(self, dashboard_wrapper: DashboardWrapper):
         log_info(f"Saving dashboard - {dashboard_wrapper.dashboard.title}")
-        resp = self.post("api/dashboards/db", self.to_json_data(dashboard_wrapper))
+        with self.metrics.phase("serialize"):
+            json_data = self.request_body(dashboard_wrapper)
+        with self.metrics.phase("upload"):
+            resp = self.post("api/dashboards/db", json_data)
 
-        log_debug(f"{resp.status_code} - {resp.content}")
         if resp.status_code == 200:
             log_info(f"Dashboard uploaded successfully")
         else:
             raise ProvisioningException(f"Dashboard uploading failed")
-        return json.loads(resp.content.decode('utf8'))
+        return from_json_data(resp.content)
+
+    def get_dashboard(self, dashboard_uid):
+        resp = self.get(f"api/dashboards/uid/{dashboard_uid}")
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Dashboard fetching failed [uid: {dashboard_uid}]")
+        return from_json_data(resp.content)
+
+    def search_dashboards(self, page=1, limit=1000) -> list:
+        resp, data = self.get_json(f"api/search?type=dash-db&limit={limit}&page={page}")
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Dashboard search failed [page: {page}]")
+        return data
+
+    def iter_dashboard_uids(self, page_size=1000):
+        """Yields the uid of every dashboard, one search page at a time."""
+        page = 1
+        while True:
+            results = self.search_dashboards(page, page_size)
+            for result in results:
+                yield result["uid"]
+            if len(results) < page_size:
+                return
+            page += 1
 
     def delete_dashboard(self, dashboard_uid):
+        """Deletes the dashboard, returning None if the interrupted run being resumed already deleted it."""
+        if self.is_step_done("delete_dashboard", dashboard_uid):
+            log_info(f"Dashboard already deleted by the interrupted run, skipping [uid: {dashboard_uid}]")
+            return None
         log_info(f"Deleting Dashboard [uid: {dashboard_uid}]")
-        return self.delete(f"api/dashboards/uid/{dashboard_uid}")
+        resp = self.delete(f"api/dashboards/uid/{dashboard_uid}")
+        if resp.status_code in (200, 404):
+            self.record_step("delete_dashboard", dashboard_uid)
+        return resp
+
+    def get_metadata(self, resource: MetadataResource):
+        """Returns the cached resource list, revalidating it with a conditional request once its TTL expired."""
+        data = self.metadata_cache.fresh_data(resource)
+        if data is not None:
+            return data
+        entry = self.metadata_cache.entry(resource)
+        resp, data = self.get_json(resource.value, entry.conditional_headers() if entry is not None else None)
+        if resp.status_code == 304 and entry is not None:
+            return self.metadata_cache.touch(resource)
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Metadata fetching failed [{resource.value}]")
+        return self.metadata_cache.store(resource, data, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+
+    def invalidate_metadata(self, resource: MetadataResource = None):
+        self.metadata_cache.invalidate(resource)
 
     def find_datasources(self):
         log_info("Getting all Datasources")
-        resp = self.get("api/datasources")
-        return json.loads(resp.content.decode('utf8'))
+        return self.get_metadata(MetadataResource.DATASOURCES)
 
     def find_zabbix_datasource(self) -> [ZabbixDatasource]:
         datasources = self.find_datasources()
         return [ZabbixDatasource.from_json(ds) for ds in datasources if
                 ds['type'] == 'alexanderzobnin-zabbix-datasource']
 
+    def find_zabbix_datasource_index(self) -> ResourceIndex:
+        datasources = self.find_datasources()
+        return self.metadata_cache.index(
+            MetadataResource.DATASOURCES, "zabbix", datasources, lambda data: ResourceIndex(
+                [ZabbixDatasource.from_json(ds) for ds in data if ds['type'] == 'alexanderzobnin-zabbix-datasource']))
+
     def add_alert_rule(self, alert_rule: AlertRule):
         log_info(f"Adding Alert Rule [uid: {alert_rule.get_uid()}]")
         return self.post("api/v1/provisioning/alert-rules", self.to_json_data(alert_rule))
 
+    def update_alert_rule(self, alert_rule: AlertRule):
+        log_info(f"Updating Alert Rule [uid: {alert_rule.get_uid()}]")
+        return self.put(f"api/v1/provisioning/alert-rules/{alert_rule.get_uid()}", self.to_json_data(alert_rule))
+
+    def upsert_alert_rule(self, alert_rule: AlertRule):
+        resp = self.update_alert_rule(alert_rule)
+        if resp.status_code == 404:
+            resp = self.add_alert_rule(alert_rule)
+        return resp
+
+    def get_alert_rule_group(self, folder_uid, group_title) -> AlertRuleGroup.AlertRuleGroup:
+        resp = self.get(f"api/v1/provisioning/folder/{folder_uid}/rule-groups/{group_title}")
+        if resp.status_code == 404:
+            return AlertRuleGroup.AlertRuleGroup(folder_uid, group_title)
+        if resp.status_code != 200:
+            raise ProvisioningException(
+                f"Alert rule group fetching failed [folder: {folder_uid}, group: {group_title}]")
+        return AlertRuleGroup.from_json(from_json_data(resp.content))
+
+    def save_alert_rule_group(self, rule_group: AlertRuleGroup.AlertRuleGroup):
+        log_info(f"Saving Alert Rule Group [folder: {rule_group.folder_uid}, group: {rule_group.title}, "
+                 f"rules: {len(rule_group.rules)}]")
+        resp = self.put(f"api/v1/provisioning/folder/{rule_group.folder_uid}/rule-groups/{rule_group.title}",
+                        self.request_body(rule_group))
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Alert rule group saving failed [group: {rule_group.title}]")
+        return resp
+
+    def delete_alert_rule_group(self, folder_uid, group_title):
+        log_info(f"Deleting Alert Rule Group [folder: {folder_uid}, group: {group_title}]")
+        resp = self.delete(f"api/v1/provisioning/folder/{folder_uid}/rule-groups/{group_title}")
+        if resp.status_code not in (200, 204, 404):
+            raise ProvisioningException(f"Alert rule group deletion failed [group: {group_title}]")
+        return resp
+
+    def add_alert_rules(self, alert_rules: [AlertRule], dashboard_uids=()):
+        """Upserts the rules with one read-modify-write of each rule group instead of one request per rule.
+
+        alert_rules are all the rules of the dashboards of dashboard_uids: their other provisioned rules, left behind
+        by renamed or removed rules, are removed in the same writes, and rule groups left empty are deleted.
+        """
+        with self.metrics.phase("alert_rules"):
+            groups = AlertRuleGroup.group_alert_rules(alert_rules)
+            stale = AlertRuleGroup.stale_rule_uids(self.find_alert_rules(), alert_rules, dashboard_uids) \
+                if dashboard_uids else {}
+            for folder_uid, group_title in list(groups) + [key for key in stale if key not in groups]:
+                rules = groups.get((folder_uid, group_title), [])
+                stale_uids = stale.get((folder_uid, group_title), set())
+                key, inputs = f"{folder_uid}/{group_title}", self.step_inputs([rules, sorted(stale_uids)])
+                if self.is_step_done("alert_rules", key, inputs):
+                    log_info(f"Alert Rule Group already saved by the interrupted run, skipping "
+                             f"[folder: {folder_uid}, group: {group_title}]")
+                    continue
+                rule_group = self.get_alert_rule_group(folder_uid, group_title)
+                if rule_group.upsert_rules(rules) + rule_group.remove_rules(stale_uids) == 0:
+                    log_info(f"Alert Rule Group unchanged, skipping [folder: {folder_uid}, group: {group_title}]")
+                elif not rule_group.rules:
+                    self.delete_alert_rule_group(folder_uid, group_title)
+                else:
+                    self.save_alert_rule_group(rule_group)
+                self.record_step("alert_rules", key, inputs)
+
     def delete_alert_rule(self, alert_rule_uid):
         log_info(f"Deleting Alert Rule [uid: {alert_rule_uid}]")
         return self.delete(f"api/v1/provisioning/alert-rules/{alert_rule_uid}")
 
+    def find_alert_rules(self):
+        resp, data = self.get_json("api/v1/provisioning/alert-rules")
+        if resp.status_code != 200:
+            raise ProvisioningException("Alert rules fetching failed")
+        return data
+
     def delete_alert_rules(self, alert_rule_uids: [str]):
-        for alert_rule_uid in alert_rule_uids:
-            self.delete_alert_rule(alert_rule_uid)
+        if not alert_rule_uids:
+            return
+        with self.metrics.phase("alert_rules"):
+            groups = AlertRuleGroup.group_rule_uids(self.find_alert_rules(), set(alert_rule_uids))
+            for (folder_uid, group_title), uids in groups.items():
+                rule_group = self.get_alert_rule_group(folder_uid, group_title)
+                rule_group.remove_rules(uids)
+                self.save_alert_rule_group(rule_group)
 
     def get_notification_policies(self):
-        resp = self.get("api/v1/provisioning/policies")
-        return json.loads(resp.content.decode('utf8'))
+        resp, data = self.get_json("api/v1/provisioning/policies")
+        if resp.status_code != 200:
+            raise ProvisioningException("Notification policies fetching failed")
+        return data
+
+    def get_notification_policy_tree(self) -> NotificationPolicyTree:
+        with self.metrics.phase("policies"):
+            return NotificationPolicyTree(self.get_notification_policies(), self.policy_layout)
+
+    def save_notification_policy_tree(self, tree: NotificationPolicyTree):
+        if not tree.dirty:
+            log_info("Notification policies unchanged, skipping")
+            return None
+        with self.metrics.phase("policies"):
+            resp = self.save_notification_policies(tree)
+        if resp.status_code not in (200, 202):
+            raise ProvisioningException(f"Notification policies saving failed")
+        tree.dirty = False
+        return resp
+
+    @contextmanager
+    def notification_policies(self):
+        """Loads the policy tree once and saves it once on exit, if it was changed.
+
+            with client.notification_policies() as tree:
+                tree.upsert_routes(routes)
+        """
+        tree = self.get_notification_policy_tree()
+        yield tree
+        self.save_notification_policy_tree(tree)
 
     def add_notification_policy_routes(self, routes):
-        policies = self.get_notification_policies()
-        policies["routes"] += routes
-        return self.save_notification_policies(policies)
+        tree = self.get_notification_policy_tree()
+        tree.upsert_routes(routes)
+        return self.save_notification_policy_tree(tree)
+
+    def migrate_notification_policies(self, layout: PolicyLayout):
+        tree = self.get_notification_policy_tree()
+        moved = tree.migrate(layout)
+        log_info(f"Migrating {moved} notification policy routes to the {layout.value} layout")
+        return self.save_notification_policy_tree(tree)
 
     def save_notification_policies(self, policies):
         log_info("Saving notification policies")
-        return self.put("api/v1/provisioning/policies", self.to_json_data(policies))
+        return self.put("api/v1/provisioning/policies", self.request_body(policies))
 
     def delete_policies_and_alert_rules_by_dashboard_uid(self, dashboard_uid):
-        policies = self.get_notification_policies()
-        new_routes = []
-        alert_rule_uids_to_delete = []
-        for route in policies["routes"]:
-            if self.get_matcher_value(route, "dashboard_uid") == dashboard_uid:
-                rule_uid = self.get_matcher_value(route, "rule_uid")
-                alert_rule_uids_to_delete.append(rule_uid)
-            else:
-                new_routes.append(route)
-
-        policies["routes"] = new_routes
-        self.save_notification_policies(policies)
+        # The routes name the rules to delete; once they are removed from the tree, only the journal still knows them.
+        alert_rule_uids_to_delete = self.step_result("delete_policies", dashboard_uid)
+        if alert_rule_uids_to_delete is None:
+            tree = self.get_notification_policy_tree()
+            alert_rule_uids_to_delete = tree.remove_dashboard(dashboard_uid)
+            self.save_notification_policy_tree(tree)
+            self.record_step("delete_policies", dashboard_uid, result=list(alert_rule_uids_to_delete))
+        if self.is_step_done("delete_alert_rules", dashboard_uid):
+            return
         self.delete_alert_rules(alert_rule_uids_to_delete)
+        self.record_step("delete_alert_rules", dashboard_uid)
 
     def find_contact_points(self):
-        resp = self.get("api/v1/provisioning/contact-points")
-        return json.loads(resp.content.decode('utf8'))
+        return self.get_metadata(MetadataResource.CONTACT_POINTS)
+
+    def find_contact_point_index(self) -> ResourceIndex:
+        contact_points = self.find_contact_points()
+        return self.metadata_cache.index(MetadataResource.CONTACT_POINTS, "all", contact_points,
+                                         lambda data: ResourceIndex([ContactPoint.from_json(cp) for cp in data]))
 
     def find_folders(self):
-        resp = self.get("api/folders")
-        return json.loads(resp.content.decode('utf8'))
+        return self.get_metadata(MetadataResource.FOLDERS)
+
+    def iter_folders(self, page_size=1000):
+        """Yields every folder, one page at a time and bypassing the metadata cache."""
+        page = 1
+        while True:
+            resp, folders = self.get_json(f"api/folders?limit={page_size}&page={page}")
+            if resp.status_code != 200:
+                raise ProvisioningException(f"Folder fetching failed [page: {page}]")
+            yield from folders
+            if len(folders) < page_size:
+                return
+            page += 1
 
-    def to_json_data(self, obj) -> str:
-        return json.dumps(obj, sort_keys=True, indent=2, cls=DashboardEncoder)
+    def save_folder(self, folder_uid, title):
+        """Creates the folder unless a folder with the uid exists."""
+        if self.get(f"api/folders/{folder_uid}").status_code == 200:
+            return None
+        log_info(f"Creating Folder [uid: {folder_uid}, title: {title}]")
+        resp = self.post("api/folders", self.to_json_data({"uid": folder_uid, "title": title}))
+        if resp.status_code != 200:
+            raise ProvisioningException(f"Folder creation failed [uid: {folder_uid}]")
+        self.invalidate_metadata(MetadataResource.FOLDERS)
+        return resp
+
+    def add_contact_point(self, contact_point: dict):
+        log_info(f"Adding Contact Point [uid: {contact_point['uid']}, name: {contact_point.get('name')}]")
+        resp = self.post("api/v1/provisioning/contact-points", self.to_json_data(contact_point))
+        if resp.status_code not in (200, 202):
+            raise ProvisioningException(f"Contact point creation failed [uid: {contact_point['uid']}]")
+        self.invalidate_metadata(MetadataResource.CONTACT_POINTS)
+        return resp
+
+    def find_folder_index(self) -> ResourceIndex:
+        folders = self.find_folders()
+        return self.metadata_cache.index(MetadataResource.FOLDERS, "all", folders,
+                                         lambda data: ResourceIndex([Folder.from_json(folder) for folder in data]))
+
+    def to_json_data(self, obj, pretty=False) -> str:
+        return to_json_data(obj, pretty)
 
     def get_matcher_value(self, notification_policy_route, label):
-        for matcher in notification_policy_route["object_matchers"]:
-            if matcher[0] == label:
-                return matcher[2]
+        return get_matcher_value(notification_policy_route, label)
+
+
+def is_connect_error(error: requests.ConnectionError) -> bool:
+    """Returns True when the connection to Grafana was never established, so the request did not reach it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def retry_count(resp) -> int:
+    retries = getattr(resp.raw, "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+
+def retry_after_seconds(resp):
+    """Returns the delay of the Retry-After header in seconds, given either as seconds or as an HTTP date."""
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after is None:
         return None
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(resp, backoff_factor, attempt) -> float:
+    retry_after = retry_after_seconds(resp)
+    if retry_after is not None:
+        return retry_after
+    return backoff_factor * (2 ** (attempt - 1))
+
+
+def body_size(data) -> int:
+    """Returns the bytes of a request body; a StreamedBody counts the bytes of its last upload."""
+    if isinstance(data, StreamedBody):
+        return data.bytes_sent
+    return len(data) if data is not None else 0
+
+
+class ByteCounter:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.count = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.count += len(chunk)
+            yield chunk
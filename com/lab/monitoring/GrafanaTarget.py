@@ -0,0 +1,107 @@
+import json
+import re
+from os import getenv
+
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.MetadataCache import MetadataCache
+from com.lab.monitoring.RunJournal import RunJournal
+from com.lab.monitoring.RunMetrics import RunMetrics
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model.RenderedBundle import RenderedBundle, RenderedDashboardWrapper
+from com.lab.monitoring.util.Util import require_env
+
+TARGET_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+# Keys of rendered dashboards and alert rules that hold a folder or datasource uid.
+FOLDER_UID_KEYS = frozenset(["folderUid", "folderUID"])
+DATASOURCE_UID_KEYS = frozenset(["datasourceUid"])
+
+
+class GrafanaTarget:
+    """A Grafana instance and organization that dashboard groups are provisioned to.
+
+    folders and datasources map the folder and datasource uids the dashboards are built with to the uids of this
+    target; the rewriting is applied to the rendered JSON, so a group is built once for every target.
+    """
+
+    def __init__(self, name, host, api_key, org_id: int = None, folders: dict = None, datasources: dict = None):
+        if not TARGET_NAME_PATTERN.fullmatch(name):
+            raise ProvisioningException(f"Grafana target name '{name}' may only contain letters, digits, '_' and '-'")
+        self.name = name
+        self.host = host
+        self.api_key = api_key
+        self.org_id: int = org_id
+        self.folders: dict = folders or {}
+        self.datasources: dict = datasources or {}
+
+    @property
+    def has_rewrites(self) -> bool:
+        return bool(self.folders or self.datasources) or self.org_id is not None
+
+    def create_client(self, run_key) -> GrafanaClient:
+        """Opens a client with its own connection pool, metadata cache, run metrics and run journal."""
+        return GrafanaClient(self.host, self.api_key, org_id=self.org_id,
+                             metadata_cache=MetadataCache.from_env(self.name), metrics=RunMetrics(),
+                             journal=RunJournal.from_env(f"{run_key}:{self.name}", self.name))
+
+    def rewrite_bundle(self, bundle: RenderedBundle) -> RenderedBundle:
+        """Returns the bundle as uploaded to this target; bundles without rewrites are shared, never copied."""
+        if not self.has_rewrites:
+            return bundle
+        return RenderedBundle(RenderedDashboardWrapper(self.rewrite_json(bundle.dashboard_wrapper.json_data)),
+                              [self.rewrite_alert_rule(rule) for rule in bundle.alert_rules],
+                              bundle.notification_policy_routes)
+
+    def rewrite_alert_rule(self, rule: dict) -> dict:
+        rewritten = self.rewrite_json(rule)
+        if self.org_id is not None:
+            rewritten["orgID"] = self.org_id
+        # Rule groups are named after their folder, see AlertRule.get_rule_group.
+        if rewritten.get("ruleGroup") == f"group-{rule.get('folderUID')}":
+            rewritten["ruleGroup"] = f"group-{rewritten.get('folderUID')}"
+        return rewritten
+
+    def rewrite_json(self, obj):
+        """Copies rendered JSON data, replacing the folder and datasource uids mapped for this target."""
+        if isinstance(obj, list):
+            return [self.rewrite_json(value) for value in obj]
+        if not isinstance(obj, dict):
+            return obj
+        rewritten = {}
+        for key, value in obj.items():
+            if key in FOLDER_UID_KEYS and isinstance(value, str):
+                value = self.folders.get(value, value)
+            elif key in DATASOURCE_UID_KEYS and isinstance(value, str):
+                value = self.datasources.get(value, value)
+            elif key == "datasource" and isinstance(value, str):
+                value = self.datasources.get(value, value)
+            elif key == "datasource" and isinstance(value, dict) and isinstance(value.get("uid"), str):
+                value = dict(value, uid=self.datasources.get(value["uid"], value["uid"]))
+            else:
+                value = self.rewrite_json(value)
+            rewritten[key] = value
+        return rewritten
+
+
+def target_from_json(json_data) -> GrafanaTarget:
+    """Reads a target; the API key is read from the environment variable named by api_key_env, never from the file."""
+    try:
+        return GrafanaTarget(json_data["name"], json_data["host"].rstrip("/"), require_env(json_data["api_key_env"]),
+                             json_data.get("org_id"), json_data.get("folders"), json_data.get("datasources"))
+    except KeyError as e:
+        raise ProvisioningException(f"Grafana target is missing {e}: {json_data}")
+
+
+def load_targets(targets_file) -> [GrafanaTarget]:
+    with open(targets_file, encoding="utf8") as f:
+        targets = [target_from_json(target) for target in json.load(f)["targets"]]
+    names = [target.name for target in targets]
+    if not targets or len(set(names)) != len(names):
+        raise ProvisioningException(f"Grafana targets file {targets_file} must list targets with unique names")
+    return targets
+
+
+def targets_from_env():
+    """Returns the targets of GRAFANA_TARGETS_FILE, or None to provision the single default Grafana instance."""
+    targets_file = getenv("GRAFANA_TARGETS_FILE")
+    return load_targets(targets_file) if targets_file is not None else None
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from os import getenv
+
+from com.lab.monitoring.util.Util import log_debug, get_env_float, target_path
+
+
+class MetadataResource(Enum):
+    DATASOURCES = "api/datasources"
+    FOLDERS = "api/folders"
+    CONTACT_POINTS = "api/v1/provisioning/contact-points"
+
+    @property
+    def env_name(self) -> str:
+        return f"GRAFANA_CACHE_TTL_{self.name}"
+
+
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class CacheEntry:
+    def __init__(self, data, fetched_at: float, etag: str = None, last_modified: str = None):
+        self.data = data
+        self.fetched_at: float = fetched_at
+        self.etag: str = etag
+        self.last_modified: str = last_modified
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_json_data(self):
+        return {
+            "data": self.data,
+            "fetched_at": self.fetched_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified
+        }
+
+
+def entry_from_json(json_data) -> CacheEntry:
+    return CacheEntry(json_data['data'], json_data['fetched_at'], json_data.get('etag'), json_data.get('last_modified'))
+
+
+class MetadataCache:
+    """Two-tier cache for rarely changing Grafana metadata: datasources, folders and contact points.
+
+    Entries live in memory and, when cache_dir is set, in one JSON file per resource, so consecutive runs share them.
+    An entry is fresh for the TTL of its resource; a stale entry keeps its ETag/Last-Modified validators for a
+    conditional request. Typed indexes built from an entry are memoized until the entry is replaced or invalidated.
+    """
+
+    def __init__(self, cache_dir=None, ttls: dict = None):
+        self.cache_dir = cache_dir
+        self.ttls = ttls if ttls is not None else {}
+        self.entries = {}
+        self.indexes = {}
+        self.lock = threading.RLock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def from_env(target_name=None):
+        ttls = {resource: get_env_float(resource.env_name, get_env_float("GRAFANA_CACHE_TTL", DEFAULT_TTL_SECONDS))
+                for resource in MetadataResource}
+        return MetadataCache(target_path(getenv("GRAFANA_CACHE_DIR"), target_name), ttls)
+
+    def ttl(self, resource: MetadataResource) -> float:
+        return self.ttls.get(resource, DEFAULT_TTL_SECONDS)
+
+    def entry(self, resource: MetadataResource) -> CacheEntry:
+        with self.lock:
+            if resource not in self.entries:
+                entry = self.read_entry(resource)
+                if entry is not None:
+                    self.entries[resource] = entry
+            return self.entries.get(resource)
+
+    def is_fresh(self, resource: MetadataResource, entry: CacheEntry) -> bool:
+        return entry is not None and time.time() - entry.fetched_at < self.ttl(resource)
+
+    def fresh_data(self, resource: MetadataResource):
+        entry = self.entry(resource)
+        if self.is_fresh(resource, entry):
+            log_debug("Metadata cache hit - %s", resource.name)
+            return entry.data
+        return None
+
+    def store(self, resource: MetadataResource, data, etag=None, last_modified=None):
+        entry = CacheEntry(data, time.time(), etag, last_modified)
+        with self.lock:
+            self.entries[resource] = entry
+            self.drop_indexes(resource)
+            self.write_entry(resource, entry)
+        return data
+
+    def touch(self, resource: MetadataResource):
+        """Marks a stale entry as fresh again after Grafana answered 304 Not Modified."""
+        with self.lock:
+            entry = self.entries[resource]
+            entry.fetched_at = time.time()
+            self.write_entry(resource, entry)
+            return entry.data
+
+    def invalidate(self, resource: MetadataResource = None):
+        with self.lock:
+            for invalidated in [resource] if resource is not None else list(MetadataResource):
+                self.entries.pop(invalidated, None)
+                self.drop_indexes(invalidated)
+                path = self.entry_path(invalidated)
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+
+    def invalidate_url(self, url):
+        for resource in MetadataResource:
+            if url.startswith(resource.value):
+                log_debug("Invalidating metadata cache - %s", resource.name)
+                self.invalidate(resource)
+
+    @contextmanager
+    def writing(self, method, url):
+        """Invalidates the resources a non-GET request to url changes, both before and after the request.
+
+        Invalidating only before would let a GET running concurrently with the write cache the data from before it.
+        """
+        if method == "GET":
+            yield
+            return
+        self.invalidate_url(url)
+        try:
+            yield
+        finally:
+            self.invalidate_url(url)
+
+    def index(self, resource: MetadataResource, name, data, factory):
+        """Returns the memoized index named name, built by factory(data) for the current entry of the resource."""
+        with self.lock:
+            if (resource, name) not in self.indexes:
+                self.indexes[(resource, name)] = factory(data)
+            return self.indexes[(resource, name)]
+
+    def drop_indexes(self, resource: MetadataResource):
+        for key in [key for key in self.indexes if key[0] == resource]:
+            del self.indexes[key]
+
+    def entry_path(self, resource: MetadataResource):
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{resource.name.lower()}.json")
+
+    def read_entry(self, resource: MetadataResource):
+        path = self.entry_path(resource)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf8") as f:
+                return entry_from_json(json.load(f))
+        except (ValueError, KeyError):
+            return None
+
+    def write_entry(self, resource: MetadataResource, entry: CacheEntry):
+        path = self.entry_path(resource)
+        if path is None:
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(entry.to_json_data(), f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,79 @@
+import json
+import time
+
+from com.lab.monitoring.DashboardGroups import group_builders, builder_name
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+from com.lab.monitoring.model.RenderedSchema import rendered_bundle_errors
+from com.lab.monitoring.util.FragmentCache import fragment_cache
+from com.lab.monitoring.util.JsonUtil import to_json_data
+from com.lab.monitoring.util.ModelValidation import model_validation
+from com.lab.monitoring.util.Util import log_info, log_error
+
+
+class ModelCheckResult:
+    def __init__(self, builder: str, errors: [str], validated_seconds: float, trusted_seconds: float):
+        self.builder: str = builder
+        self.errors: [str] = errors
+        self.validated_seconds: float = validated_seconds
+        self.trusted_seconds: float = trusted_seconds
+
+
+def render(builder) -> (float, [str]):
+    """Builds the bundle of a builder with an empty fragment cache and returns the build time and its rendered JSON."""
+    fragment_cache.clear()
+    start = time.perf_counter()
+    bundle = builder()
+    seconds = time.perf_counter() - start
+    if not isinstance(bundle, DashboardBundle):
+        raise ProvisioningException(f"Dashboard builder {builder_name(builder)} must return a DashboardBundle")
+    return seconds, [to_json_data(bundle.dashboard_wrapper), to_json_data(bundle.alert_rules),
+                     to_json_data(bundle.notification_policy_routes)]
+
+
+def check_builder(builder) -> ModelCheckResult:
+    """Builds a dashboard with and without attrs validation and checks both renders against the schemas.
+
+    The validated build fails on any value the attrs validators reject. The trusted build is what TRUSTED_MODELS runs
+    upload, so its JSON is checked against the schemas as well, and it must render the same as the validated build:
+    a builder rendering differently between builds (random uids, timestamps) cannot be checked once for all runs.
+    """
+    with model_validation(True):
+        validated_seconds, validated = render(builder)
+    with model_validation(False):
+        trusted_seconds, trusted = render(builder)
+    errors = rendered_bundle_errors(*[json.loads(rendered) for rendered in validated])
+    errors += [f"without validation {error}"
+               for error in rendered_bundle_errors(*[json.loads(rendered) for rendered in trusted])
+               if error not in errors]
+    for name, validated_json, trusted_json in zip(["dashboard", "alert rules", "policy routes"], validated, trusted):
+        if validated_json != trusted_json:
+            errors.append(f"{name} render differently without validation")
+    return ModelCheckResult(builder_name(builder), errors, validated_seconds, trusted_seconds)
+
+
+def check_groups(group_names: [str]) -> [ModelCheckResult]:
+    results = []
+    for group_name in group_names:
+        try:
+            builders = group_builders(group_name)
+        except ImportError as e:
+            log_error(f"{group_name}: group module cannot be imported: {e}")
+            results.append(ModelCheckResult(group_name, [f"group module cannot be imported: {e}"], 0.0, 0.0))
+            continue
+        for builder in builders:
+            try:
+                result = check_builder(builder)
+            except Exception as e:
+                result = ModelCheckResult(builder_name(builder), [f"build failed: {e}"], 0.0, 0.0)
+            for error in result.errors:
+                log_error(f"{result.builder}: {error}")
+            results.append(result)
+    validated_seconds = sum(result.validated_seconds for result in results)
+    trusted_seconds = sum(result.trusted_seconds for result in results)
+    failed = sum(1 for result in results if result.errors)
+    log_info(f"Checked {len(results)} dashboard builders, {failed} failed; build time {validated_seconds:.2f}s "
+             f"validated, {trusted_seconds:.2f}s trusted")
+    if failed:
+        raise ProvisioningException(f"{failed} of {len(results)} dashboard builders failed the model check")
+    return results
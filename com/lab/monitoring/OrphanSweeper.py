@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model import AlertRuleGroup
+from com.lab.monitoring.util.Util import log_info, log_error
+
+
+class SweepResult:
+    def __init__(self, alert_rule_uids: [str], route_rule_uids: [str], rule_groups: int):
+        self.alert_rule_uids: [str] = alert_rule_uids
+        self.route_rule_uids: [str] = route_rule_uids
+        self.rule_groups: int = rule_groups
+
+
+class OrphanSweeper:
+    """Deletes the alert rules and notification policy routes left behind by dashboards that no longer exist.
+
+    The policy tree, the alert rules and the dashboard uids are each downloaded once and joined in memory on the
+    rule_uid and dashboard_uid labels set by AlertRule and NotificationPolicyRoute. Orphans are:
+
+    - alert rules whose dashboard_uid label names no existing dashboard,
+    - routes whose dashboard no longer exists or whose alert rule no longer exists.
+
+    Rules without these labels (e.g. created by hand) and rules whose route is missing are kept. Provisioning writes
+    the dashboard, then its alert rules, then its routes; they are read in the reverse order, so objects provisioned
+    during the sweep are never mistaken for orphans. The routes are removed with one policy update, the rules with one
+    read and one write per affected rule group on a worker pool.
+    """
+
+    def __init__(self, client: GrafanaClient, max_workers=8, dry_run=False):
+        self.client = client
+        self.max_workers = max_workers
+        self.dry_run = dry_run
+
+    def sweep(self) -> SweepResult:
+        tree = self.client.get_notification_policy_tree()
+        alert_rules = self.client.find_alert_rules()
+        dashboard_uids = set(self.client.iter_dashboard_uids())
+
+        orphan_rule_uids = {rule["uid"] for rule in alert_rules if is_orphan_rule(rule, dashboard_uids)}
+        orphan_route_rule_uids = tree.orphan_rule_uids(dashboard_uids,
+                                                       {rule["uid"] for rule in alert_rules} - orphan_rule_uids)
+        groups = AlertRuleGroup.group_rule_uids(alert_rules, orphan_rule_uids)
+
+        log_info(f"Found {len(orphan_rule_uids)} orphan alert rules in {len(groups)} rule groups and "
+                 f"{len(orphan_route_rule_uids)} orphan notification policy routes among {len(dashboard_uids)} "
+                 f"dashboards")
+        result = SweepResult(sorted(orphan_rule_uids), sorted(orphan_route_rule_uids), len(groups))
+        if self.dry_run:
+            for rule_uid in result.alert_rule_uids:
+                log_info(f"  Orphan alert rule [uid: {rule_uid}]")
+            for rule_uid in result.route_rule_uids:
+                log_info(f"  Orphan notification policy route [rule_uid: {rule_uid}]")
+            return result
+
+        # Routes go first, like delete_policies_and_alert_rules_by_dashboard_uid: a rule left behind by a failure is
+        # found again by the next sweep through its labels.
+        for rule_uid in orphan_route_rule_uids:
+            tree.remove_rule(rule_uid)
+        self.client.save_notification_policy_tree(tree)
+        self.delete_rules(groups)
+        return result
+
+    def delete_rules(self, groups: dict):
+        failures = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.delete_group_rules, key, uids): key
+                       for key, uids in groups.items()}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failures += 1
+                    log_error(f"Orphan alert rule deletion failed [folder: {futures[future][0]}, "
+                              f"group: {futures[future][1]}]: {future.exception()}")
+        if failures:
+            raise ProvisioningException(f"Orphan alert rule deletion failed for {failures} rule groups")
+
+    def delete_group_rules(self, key, uids: set):
+        # Rule groups are shared by the dashboards of a folder, so the group is read again: a run provisioning another
+        # dashboard of the folder may have added rules to it since the listing.
+        folder_uid, group_title = key
+        rule_group = self.client.get_alert_rule_group(folder_uid, group_title)
+        if rule_group.remove_rules(uids) == 0:
+            return None
+        if not rule_group.rules:
+            return self.client.delete_alert_rule_group(folder_uid, group_title)
+        return self.client.save_alert_rule_group(rule_group)
+
+
+def is_orphan_rule(rule: dict, dashboard_uids: set) -> bool:
+    # Rules of dashboards built without a uid carry an empty dashboard_uid label, which names no dashboard.
+    labels = rule.get("labels") or {}
+    return bool(labels.get("rule_uid")) and bool(labels.get("dashboard_uid")) and \
+        labels["dashboard_uid"] not in dashboard_uids
@@ -0,0 +1,237 @@
+import threading
+import time
+from collections import deque
+from os import getenv
+
+from com.lab.monitoring.util.Util import log_info, log_debug, get_env_int, get_env_float
+
+# Responses that mean Grafana, or a proxy in front of it, is overloaded.
+OVERLOAD_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+# A response is a latency spike only once its baseline has this many samples and if it took at least
+# MIN_SPIKE_LATENCY seconds, so the jitter of fast endpoints never shrinks the limit.
+LATENCY_BASELINE_SAMPLES = 5
+MIN_SPIKE_LATENCY = 0.25
+
+# The baseline of a method, endpoint and body size class is a low percentile of its last LATENCY_WINDOW healthy
+# latencies. It follows lasting changes of the endpoint, like grown dashboards, but not the slow responses of an
+# overloaded Grafana, which are spikes and not recorded, while a few fast responses keep it low.
+LATENCY_WINDOW = 50
+LATENCY_BASELINE_PERCENTILE = 0.1
+
+# Request bodies up to BODY_SIZE_CLASS_BYTES share a baseline; larger ones have one per factor of 4, so uploading a
+# large dashboard is not compared with the latency of small ones.
+BODY_SIZE_CLASS_BYTES = 16 * 1024
+
+
+class TokenBucket:
+    """Allows rate requests per second on average and bursts of up to burst requests.
+
+    A caller that finds the bucket empty reserves the next token and sleeps until it is due, so waiting callers are
+    served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token, returning the seconds waited for it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RequestScheduler:
+    """Paces the requests of a GrafanaClient with a token bucket and an adaptive concurrency limit.
+
+    The concurrency limit is halved when a request gets an overload response (429, 502, 503, 504), fails to connect or
+    takes longer than latency_tolerance times the baseline latency of its method, endpoint and body size (see
+    LATENCY_WINDOW); it grows back by one for every limit healthy responses, up to max_concurrency (additive increase,
+    multiplicative decrease). Only requests started after the last decrease can decrease it again, so one burst of
+    errors shrinks the limit once. A Retry-After header pauses all requests of the scheduler, not just the retried one.
+
+        scheduler = RequestScheduler(max_concurrency=10, rate=20)
+        with scheduler.slot("POST", "api/dashboards/db") as slot:
+            resp = session.post(..., data=body)
+            slot.complete(resp.status_code, retry_after_seconds(resp), len(body))
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, rate: float = 0, burst: int = None,
+                 adaptive: bool = True, latency_tolerance: float = 3.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.bucket = TokenBucket(rate, burst if burst is not None else max(1, int(rate))) if rate > 0 else None
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        self.latencies = {}
+        self.lowest_limit = self.max_concurrency
+        self.decreases = 0
+        self.overloads = 0
+        self.latency_spikes = 0
+        self.pauses = 0
+        self.throttled_seconds = 0.0
+        self.condition = threading.Condition()
+
+    @staticmethod
+    def from_env(max_concurrency: int):
+        """Returns a scheduler if GRAFANA_RATE_LIMIT or GRAFANA_ADAPTIVE_CONCURRENCY enable one, else None."""
+        rate = get_env_float("GRAFANA_RATE_LIMIT", 0.0)
+        adaptive = getenv("GRAFANA_ADAPTIVE_CONCURRENCY", "False").lower() == "true"
+        if rate <= 0 and not adaptive:
+            return None
+        return RequestScheduler(get_env_int("GRAFANA_MAX_CONCURRENCY", max_concurrency),
+                                get_env_int("GRAFANA_MIN_CONCURRENCY", 1),
+                                rate,
+                                get_env_int("GRAFANA_RATE_BURST", max(1, int(rate))),
+                                adaptive,
+                                get_env_float("GRAFANA_LATENCY_TOLERANCE", 3.0))
+
+    def slot(self, method, endpoint):
+        return RequestSlot(self, method, endpoint)
+
+    def acquire(self) -> float:
+        """Waits for a free slot, the end of a Retry-After pause and a token; returns when the request started."""
+        waited_since = time.monotonic()
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(pause if pause > 0 else None)
+            self.in_flight += 1
+        if self.bucket is not None:
+            self.bucket.acquire()
+        started_at = time.monotonic()
+        with self.condition:
+            self.throttled_seconds += started_at - waited_since
+        return started_at
+
+    def release(self, method, endpoint, started_at, status_code=None, retry_after: float = None, body_bytes=0):
+        """Frees the slot of a request and adapts the limit; status_code None means the request failed to connect."""
+        now = time.monotonic()
+        latency = now - started_at
+        key = (method, endpoint, body_size_class(body_bytes))
+        with self.condition:
+            self.in_flight -= 1
+            if retry_after is not None and retry_after > 0 and now + retry_after > self.paused_until:
+                self.paused_until = now + retry_after
+                self.pauses += 1
+                log_info(f"Grafana asked to retry after {retry_after:.1f}s, pausing requests")
+            if status_code is None or status_code in OVERLOAD_STATUS_CODES:
+                self.overloads += 1
+                self.decrease(started_at, f"response {status_code or 'connection error'} from {method} {endpoint}")
+            elif self.is_latency_spike(key, latency):
+                self.latency_spikes += 1
+                self.decrease(started_at, f"{latency:.2f}s latency of {method} {endpoint}")
+            else:
+                self.observe_latency(key, latency)
+                self.increase()
+            self.condition.notify_all()
+
+    def is_latency_spike(self, key, latency) -> bool:
+        window = self.latencies.get(key)
+        if window is None or len(window) < LATENCY_BASELINE_SAMPLES:
+            return False
+        baseline = sorted(window)[int(LATENCY_BASELINE_PERCENTILE * (len(window) - 1))]
+        return latency > max(baseline * self.latency_tolerance, MIN_SPIKE_LATENCY)
+
+    def observe_latency(self, key, latency):
+        if key not in self.latencies:
+            self.latencies[key] = deque(maxlen=LATENCY_WINDOW)
+        self.latencies[key].append(latency)
+
+    def decrease(self, started_at, reason):
+        if not self.adaptive or started_at < self.decreased_at:
+            return
+        self.decreased_at = time.monotonic()
+        self.successes = 0
+        limit = max(float(self.min_concurrency), self.limit / 2)
+        if int(limit) < int(self.limit):
+            self.decreases += 1
+            self.lowest_limit = min(self.lowest_limit, int(limit))
+            log_info(f"Reducing Grafana request concurrency from {int(self.limit)} to {int(limit)} after {reason}")
+        self.limit = limit
+
+    def increase(self):
+        if not self.adaptive or self.limit >= self.max_concurrency:
+            return
+        self.successes += 1
+        if self.successes >= int(self.limit):
+            self.successes = 0
+            self.limit = min(float(self.max_concurrency), self.limit + 1)
+            log_debug("Raising Grafana request concurrency to %s", int(self.limit))
+
+    def to_json_data(self):
+        with self.condition:
+            return {
+                "concurrency_limit": int(self.limit),
+                "min_concurrency": self.min_concurrency,
+                "max_concurrency": self.max_concurrency,
+                "lowest_concurrency_limit": self.lowest_limit,
+                "rate_limit": self.bucket.rate if self.bucket is not None else None,
+                "rate_burst": self.bucket.burst if self.bucket is not None else None,
+                "decreases": self.decreases,
+                "overload_responses": self.overloads,
+                "latency_spikes": self.latency_spikes,
+                "retry_after_pauses": self.pauses,
+                "throttled_seconds": round(self.throttled_seconds, 6)
+            }
+
+    def log_summary(self):
+        stats = self.to_json_data()
+        rate = f"{stats['rate_limit']}/s" if stats["rate_limit"] is not None else "unlimited"
+        log_info(f"Request scheduler: concurrency {stats['concurrency_limit']} "
+                 f"(lowest {stats['lowest_concurrency_limit']}, range {stats['min_concurrency']}-"
+                 f"{stats['max_concurrency']}), rate {rate}, {stats['overload_responses']} overload responses, "
+                 f"{stats['latency_spikes']} latency spikes, {stats['retry_after_pauses']} Retry-After pauses, "
+                 f"{stats['throttled_seconds']:.2f}s throttled")
+
+
+def body_size_class(body_bytes) -> int:
+    size_class = 0
+    while body_bytes > BODY_SIZE_CLASS_BYTES:
+        body_bytes //= 4
+        size_class += 1
+    return size_class
+
+
+class RequestSlot:
+    """A request admitted by a RequestScheduler; leaving the block without complete() counts as a connection error."""
+
+    def __init__(self, scheduler: RequestScheduler, method, endpoint):
+        self.scheduler = scheduler
+        self.method = method
+        self.endpoint = endpoint
+        self.started_at = None
+        self.status_code = None
+        self.retry_after = None
+        self.body_bytes = 0
+
+    def complete(self, status_code, retry_after: float = None, body_bytes=0):
+        """Records the response; body_bytes is the size of the request body sent, known once a streamed body was."""
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.body_bytes = body_bytes
+
+    def __enter__(self):
+        self.started_at = self.scheduler.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.scheduler.release(self.method, self.endpoint, self.started_at, self.status_code, self.retry_after,
+                               self.body_bytes)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from os import getenv
+
+from com.lab.monitoring.util.Util import log_info, target_path
+
+JOURNAL_VERSION = 1
+
+
+class RunJournal:
+    """Checkpoints the completed steps of a provisioning or deletion run, so an interrupted run can be resumed.
+
+    Every completed step (dashboard upload, alert rule group save, policy tree update, deletion) is appended to the
+    journal file as soon as Grafana confirmed it, together with the hash of its inputs and, where a later step needs
+    it, its result. A rerun of the same run skips the steps recorded with the same inputs and redoes the others; a step
+    whose inputs changed since is never skipped. The journal is removed once the run completes, so the next run starts
+    from scratch.
+
+    Journal layout, one JSON object per line:
+
+        {"version": 1, "run": "<run key>", "started_at": <timestamp>}
+        {"step": "dashboard", "key": "<uid>", "inputs": "<hash>"}
+        {"step": "delete_policies", "key": "<uid>", "inputs": null, "result": ["<rule uid>", ...]}
+    """
+
+    def __init__(self, journal_file, run_key):
+        self.journal_file = journal_file
+        self.run_key = run_key
+        self.steps = {}
+        self.resumed = 0
+        self.lock = threading.Lock()
+        self.file = None
+
+    @staticmethod
+    def from_env(run_key, target_name=None):
+        if getenv("RESUMABLE_PROVISIONING", "False").lower() != "true":
+            return None
+        return RunJournal(target_path(getenv("RUN_JOURNAL_FILE", ".run-journal.jsonl"), target_name), run_key).open()
+
+    def open(self):
+        """Loads the steps of an interrupted run with the same key and opens the journal for appending."""
+        self.steps = self.load_steps()
+        if self.steps:
+            log_info(f"Resuming run {self.run_key} from {self.journal_file}, {len(self.steps)} steps completed")
+            self.drop_torn_line()
+            self.file = open(self.journal_file, "a", encoding="utf8")
+        else:
+            self.file = open(self.journal_file, "w", encoding="utf8")
+            self.append({"version": JOURNAL_VERSION, "run": self.run_key, "started_at": time.time()})
+        return self
+
+    def load_steps(self) -> dict:
+        if not os.path.exists(self.journal_file):
+            return {}
+        with open(self.journal_file, encoding="utf8") as f:
+            lines = f.read().splitlines()
+        header = decode_line(lines[0]) if lines else None
+        if header is None or header.get("version") != JOURNAL_VERSION or header.get("run") != self.run_key:
+            log_info(f"Discarding journal {self.journal_file} of another run")
+            return {}
+        steps = {}
+        for line in lines[1:]:
+            entry = decode_line(line)
+            # The last line is incomplete if the run was killed while writing it.
+            if entry is not None:
+                steps[(entry["step"], entry["key"])] = entry
+        return steps
+
+    def drop_torn_line(self):
+        """Truncates the journal to its last complete line, so the next entry is not appended to a torn one."""
+        with open(self.journal_file, "rb+") as f:
+            content = f.read()
+            end = content.rfind(b"\n") + 1
+            if end < len(content):
+                f.truncate(end)
+
+    def is_done(self, step, key, inputs=None) -> bool:
+        with self.lock:
+            entry = self.steps.get((step, key))
+            done = entry is not None and entry["inputs"] == inputs
+            if done:
+                self.resumed += 1
+        return done
+
+    def result(self, step, key, inputs=None):
+        """Returns the result recorded for a completed step, None if it was not completed with these inputs."""
+        with self.lock:
+            entry = self.steps.get((step, key))
+            if entry is None or entry["inputs"] != inputs:
+                return None
+            self.resumed += 1
+        return entry.get("result")
+
+    def record(self, step, key, inputs=None, result=None):
+        entry = {"step": step, "key": key, "inputs": inputs}
+        if result is not None:
+            entry["result"] = result
+        with self.lock:
+            self.steps[(step, key)] = entry
+            self.append(entry)
+
+    def append(self, entry: dict):
+        self.file.write(json.dumps(entry, sort_keys=True) + "\n")
+        self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def complete(self):
+        """Removes the journal of a completed run."""
+        self.close()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        if self.resumed:
+            log_info(f"Run {self.run_key} completed, {self.resumed} steps skipped from the interrupted run")
+
+
+def decode_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
@@ -0,0 +1,292 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import getenv
+
+from com.lab.monitoring.util.Util import log_info, target_path
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROVISIONING_PHASES = ("render", "serialize", "upload", "alert_rules", "policies")
+
+# Status recorded for requests that failed without a response, e.g. on connection errors and timeouts.
+NO_RESPONSE_STATUS = 0
+
+# Uids in request paths are replaced by placeholders, so every endpoint is a single series.
+ENDPOINT_TEMPLATES = [
+    (re.compile(r"^api/dashboards/uid/[^/?]+"), "api/dashboards/uid/{uid}"),
+    (re.compile(r"^api/v1/provisioning/alert-rules/[^/?]+"), "api/v1/provisioning/alert-rules/{uid}"),
+    (re.compile(r"^api/v1/provisioning/folder/[^/]+/rule-groups/[^/?]+"),
+     "api/v1/provisioning/folder/{uid}/rule-groups/{group}"),
+]
+
+current_dashboard = ContextVar("current_dashboard", default=None)
+
+
+def endpoint_template(url) -> str:
+    for pattern, template in ENDPOINT_TEMPLATES:
+        if pattern.match(url):
+            return template
+    return url.split("?")[0]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def to_json_data(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+    def to_json_data(self):
+        return {
+            "latency_seconds": self.latency,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries
+        }
+
+
+class DashboardStats:
+    def __init__(self, title):
+        self.title = title
+        self.phases = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def to_json_data(self):
+        return {
+            "title": self.title,
+            "phases_seconds": {phase: round(seconds, 6) for phase, seconds in self.phases.items()},
+            "total_seconds": round(sum(self.phases.values()), 6),
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received
+        }
+
+
+class RunMetrics:
+    """Collects request and phase timings of a provisioning run.
+
+    Requests are recorded per (method, endpoint) and attributed to the dashboard of the enclosing dashboard() block,
+    which is tracked in a context variable and so works for worker threads as well as asyncio tasks.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.endpoints = {}
+        self.phases = {}
+        self.dashboards = {}
+        self.schedulers = {}
+        self.lock = threading.Lock()
+
+    def record_request(self, method, url, status_code, duration, bytes_sent, bytes_received, retries=0):
+        key = (method, endpoint_template(url))
+        dashboard_uid = current_dashboard.get()
+        with self.lock:
+            stats = self.endpoints.setdefault(key, EndpointStats())
+            stats.latency.observe(duration)
+            stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.retries += retries
+            if dashboard_uid is not None and dashboard_uid in self.dashboards:
+                dashboard = self.dashboards[dashboard_uid]
+                dashboard.requests += 1
+                dashboard.bytes_sent += bytes_sent
+                dashboard.bytes_received += bytes_received
+
+    def register_scheduler(self, grafana_host, scheduler):
+        """Reports the limits of the RequestScheduler of the client of grafana_host with the run metrics."""
+        with self.lock:
+            self.schedulers[grafana_host] = scheduler
+
+    @contextmanager
+    def dashboard(self, dashboard_uid, dashboard_title=None):
+        """Attributes the phases and requests inside the block to the dashboard."""
+        if dashboard_uid is None:
+            yield
+            return
+        with self.lock:
+            self.dashboards.setdefault(dashboard_uid, DashboardStats(dashboard_title))
+        token = current_dashboard.set(dashboard_uid)
+        try:
+            yield
+        finally:
+            current_dashboard.reset(token)
+
+    @contextmanager
+    def phase(self, name):
+        """Times a provisioning phase, one of PROVISIONING_PHASES.
+
+            with run_metrics.dashboard(dashboard.uid, dashboard.title), run_metrics.phase("render"):
+                ...
+        """
+        dashboard_uid = current_dashboard.get()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_phase(name, time.monotonic() - start, dashboard_uid)
+
+    def observe_phase(self, name, duration, dashboard_uid=None):
+        """Records a phase timed by the caller, for the current dashboard unless dashboard_uid is given."""
+        dashboard_uid = dashboard_uid if dashboard_uid is not None else current_dashboard.get()
+        with self.lock:
+            self.phases.setdefault(name, Histogram()).observe(duration)
+            if dashboard_uid in self.dashboards:
+                dashboard = self.dashboards[dashboard_uid]
+                dashboard.phases[name] = dashboard.phases.get(name, 0.0) + duration
+
+    def to_json_data(self):
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 6),
+                "requests": [dict(stats.to_json_data(), method=method, endpoint=endpoint)
+                             for (method, endpoint), stats in sorted(self.endpoints.items())],
+                "phases_seconds": {phase: histogram for phase, histogram in sorted(self.phases.items())},
+                "dashboards": {uid: stats for uid, stats in sorted(self.dashboards.items())},
+                "schedulers": {host: scheduler for host, scheduler in sorted(self.schedulers.items())}
+            }
+
+    def to_prometheus_text(self, labels: dict = None) -> str:
+        base_labels = labels or {}
+        lines = []
+        with self.lock:
+            add_help(lines, "grafana_provisioning_request_duration_seconds", "histogram",
+                     "Latency of Grafana API requests")
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                add_histogram(lines, "grafana_provisioning_request_duration_seconds", stats.latency,
+                              dict(base_labels, method=method, endpoint=endpoint))
+            add_help(lines, "grafana_provisioning_requests_total", "counter", "Grafana API requests by status")
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                for status, count in sorted(stats.statuses.items()):
+                    add_sample(lines, "grafana_provisioning_requests_total", count,
+                               dict(base_labels, method=method, endpoint=endpoint, status=str(status)))
+            for name, attribute, description in (
+                    ("grafana_provisioning_request_bytes_sent_total", "bytes_sent", "Request body bytes sent"),
+                    ("grafana_provisioning_request_bytes_received_total", "bytes_received",
+                     "Response body bytes received"),
+                    ("grafana_provisioning_request_retries_total", "retries", "Retried Grafana API requests")):
+                add_help(lines, name, "counter", description)
+                for (method, endpoint), stats in sorted(self.endpoints.items()):
+                    add_sample(lines, name, getattr(stats, attribute),
+                               dict(base_labels, method=method, endpoint=endpoint))
+            add_help(lines, "grafana_provisioning_phase_duration_seconds", "histogram",
+                     "Duration of provisioning phases")
+            for phase, histogram in sorted(self.phases.items()):
+                add_histogram(lines, "grafana_provisioning_phase_duration_seconds", histogram,
+                              dict(base_labels, phase=phase))
+            add_help(lines, "grafana_provisioning_dashboard_duration_seconds", "gauge",
+                     "Total provisioning time per dashboard")
+            for uid, stats in sorted(self.dashboards.items()):
+                add_sample(lines, "grafana_provisioning_dashboard_duration_seconds", sum(stats.phases.values()),
+                           dict(base_labels, dashboard_uid=uid))
+            schedulers = sorted((host, scheduler.to_json_data()) for host, scheduler in self.schedulers.items())
+        if schedulers:
+            for name, key, metric_type, description in (
+                    ("grafana_provisioning_concurrency_limit", "concurrency_limit", "gauge",
+                     "Concurrency limit of Grafana API requests at the end of the run"),
+                    ("grafana_provisioning_lowest_concurrency_limit", "lowest_concurrency_limit", "gauge",
+                     "Lowest concurrency limit of Grafana API requests during the run"),
+                    ("grafana_provisioning_rate_limit", "rate_limit", "gauge",
+                     "Configured rate limit of Grafana API requests per second"),
+                    ("grafana_provisioning_overload_responses_total", "overload_responses", "counter",
+                     "Grafana API responses signalling overload"),
+                    ("grafana_provisioning_latency_spikes_total", "latency_spikes", "counter",
+                     "Grafana API responses slower than the latency tolerance"),
+                    ("grafana_provisioning_throttled_seconds_total", "throttled_seconds", "counter",
+                     "Time requests waited for the request scheduler")):
+                add_help(lines, name, metric_type, description)
+                for host, stats in schedulers:
+                    if stats[key] is not None:
+                        add_sample(lines, name, stats[key], dict(base_labels, grafana_host=host))
+        add_help(lines, "grafana_provisioning_run_duration_seconds", "gauge", "Duration of the provisioning run")
+        add_sample(lines, "grafana_provisioning_run_duration_seconds", time.time() - self.started_at, base_labels)
+        add_help(lines, "grafana_provisioning_run_timestamp_seconds", "gauge", "Start of the provisioning run")
+        add_sample(lines, "grafana_provisioning_run_timestamp_seconds", self.started_at, base_labels)
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, report_file=None, textfile=None, labels: dict = None):
+        if report_file is not None:
+            write_atomically(report_file, json.dumps(self, default=lambda obj: obj.to_json_data(), indent=2))
+            log_info(f"Run report written to {report_file}")
+        if textfile is not None:
+            write_atomically(textfile, self.to_prometheus_text(labels))
+            log_info(f"Prometheus metrics written to {textfile}")
+
+    def write_reports_from_env(self, target_name=None):
+        labels = {}
+        if getenv("DASHBOARD_GROUP") is not None:
+            labels["group"] = getenv("DASHBOARD_GROUP")
+        if target_name is not None:
+            labels["target"] = target_name
+        self.write_reports(target_path(getenv("METRICS_REPORT_FILE"), target_name),
+                           target_path(getenv("METRICS_TEXTFILE"), target_name), labels or None)
+
+
+def add_help(lines, name, metric_type, description):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def add_sample(lines, name, value, labels: dict):
+    lines.append(f"{name}{format_labels(labels)} {value}")
+
+
+def add_histogram(lines, name, histogram: Histogram, labels: dict):
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        add_sample(lines, f"{name}_bucket", count, dict(labels, le=str(bound)))
+    add_sample(lines, f"{name}_bucket", histogram.count, dict(labels, le="+Inf"))
+    add_sample(lines, f"{name}_sum", histogram.sum, labels)
+    add_sample(lines, f"{name}_count", histogram.count, labels)
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_atomically(path, content: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# Metrics of the current process, shared by all clients unless one is given explicitly.
+run_metrics = RunMetrics()
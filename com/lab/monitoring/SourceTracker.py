@@ -0,0 +1,190 @@
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from importlib.metadata import version, PackageNotFoundError
+from os import getenv
+
+from com.lab.monitoring.DashboardGroups import builder_name
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+from com.lab.monitoring.util.JsonUtil import content_hash
+from com.lab.monitoring.util.Util import log_info, log_debug, target_path
+
+# Modules of these packages are hashed together with the builder modules importing them, third-party packages are
+# covered by their installed version instead.
+TRACKED_PACKAGES = ("com.lab",)
+TRACKED_DISTRIBUTIONS = ("grafanalib", "attrs")
+
+STATE_VERSION = 1
+
+
+class SourceTracker:
+    """Remembers which dashboard builders produced which dashboards and the sources and inputs they were built from.
+
+    A builder is fingerprinted with the source of its module and of every com.lab module it imports, directly or
+    through shared helpers. The inputs fingerprint covers the Grafana datasources and folders the builders look up and
+    the versions of grafanalib and attrs. A builder whose fingerprints match the state file of the last successful run
+    is neither built nor uploaded again.
+
+    State file layout:
+
+        {"version": 1, "groups": {"<group>": {"<module:qualname>": {"source": "<hash>", "inputs": "<hash>",
+                                                                     "dashboard_uid": "<uid>"}}}}
+    """
+
+    def __init__(self, state_file, inputs_hash: str):
+        self.state_file = state_file
+        self.inputs_hash = inputs_hash
+        self.state = self.load_state()
+        self.source_hashes = {}
+        self.module_hashes = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_env(client, target_name=None):
+        if getenv("INCREMENTAL_PROVISIONING", "False").lower() != "true":
+            return None
+        return SourceTracker.create(client, target_name)
+
+    @staticmethod
+    def create(client, target_name=None):
+        return SourceTracker(target_path(getenv("SOURCE_STATE_FILE", ".source-state.json"), target_name),
+                             inputs_hash(client))
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {"version": STATE_VERSION, "groups": {}}
+        with open(self.state_file, encoding="utf8") as f:
+            state = json.load(f)
+        if state.get("version") != STATE_VERSION:
+            return {"version": STATE_VERSION, "groups": {}}
+        return state
+
+    def save_state(self):
+        with self.lock:
+            state = json.loads(json.dumps(self.state))
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w", encoding="utf8") as f:
+            json.dump(state, f, sort_keys=True, indent=2)
+        os.replace(tmp_file, self.state_file)
+        log_info(f"Saved source state for {sum(len(builders) for builders in state['groups'].values())} "
+                 f"dashboard builders to {self.state_file}")
+
+    def changed_builders(self, group_name, builders) -> list:
+        """Returns the builders whose source or inputs changed since they were last provisioned."""
+        with self.lock:
+            previous = dict(self.state["groups"].get(group_name, {}))
+        changed = [builder for builder in builders if self.has_changed(builder, previous.get(builder_name(builder)))]
+        log_info(f"{len(changed)} of {len(builders)} dashboard builders of group {group_name} changed")
+        return changed
+
+    def mark_built(self, group_name, builder, bundle: DashboardBundle):
+        with self.lock:
+            self.state["groups"].setdefault(group_name, {})[builder_name(builder)] = {
+                "source": self.source_hash(builder),
+                "inputs": self.inputs_hash,
+                "dashboard_uid": bundle.uid
+            }
+
+    def has_changed(self, builder, previous: dict) -> bool:
+        return previous is None or previous.get("inputs") != self.inputs_hash or \
+            previous.get("source") != self.source_hash(builder)
+
+    def retain_builders(self, group_name, builders):
+        """Forgets builders removed from the group, so the state file does not grow forever."""
+        names = {builder_name(builder) for builder in builders}
+        with self.lock:
+            group = self.state["groups"].get(group_name, {})
+            self.state["groups"][group_name] = {name: entry for name, entry in group.items() if name in names}
+
+    def invalidate(self, module_names: [str]):
+        """Forgets the hashes of changed modules and of all builders, for modules changed while the process runs."""
+        with self.lock:
+            for module_name in module_names:
+                self.module_hashes.pop(module_name, None)
+            self.source_hashes.clear()
+
+    def source_hash(self, builder) -> str:
+        name = builder_name(builder)
+        if name not in self.source_hashes:
+            modules = sorted(self.module_closure(builder.__module__))
+            self.source_hashes[name] = content_hash({
+                "builder": name,
+                "modules": {module_name: self.module_hash(module_name) for module_name in modules}
+            })
+            log_debug("Builder %s depends on %s", name, modules)
+        return self.source_hashes[name]
+
+    def module_closure(self, module_name) -> set:
+        closure = set()
+        pending = [module_name]
+        while pending:
+            name = pending.pop()
+            if name in closure:
+                continue
+            closure.add(name)
+            pending.extend(imported_modules(name))
+        return closure
+
+    def module_hash(self, module_name) -> str:
+        if module_name not in self.module_hashes:
+            path = module_path(module_name)
+            with open(path, "rb") as f:
+                self.module_hashes[module_name] = hashlib.sha256(f.read()).hexdigest()
+        return self.module_hashes[module_name]
+
+
+def is_tracked(module_name) -> bool:
+    return any(module_name == package or module_name.startswith(f"{package}.") for package in TRACKED_PACKAGES)
+
+
+def module_path(module_name):
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or not spec.origin.endswith(".py"):
+        return None
+    return spec.origin
+
+
+def imported_modules(module_name) -> [str]:
+    """Returns the tracked modules module_name imports, as read from its source."""
+    path = module_path(module_name)
+    if path is None:
+        return []
+    with open(path, encoding="utf8") as f:
+        tree = ast.parse(f.read(), path)
+    package = module_name if path.endswith("__init__.py") else module_name.rpartition(".")[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level > 0:
+                parent = package.rsplit(".", node.level - 1)[0] if node.level > 1 else package
+                base = f"{parent}.{base}" if base else parent
+            names.append(base)
+            # "from package import module" imports a module, "from module import name" does not.
+            names.extend(f"{base}.{alias.name}" for alias in node.names)
+    return [name for name in names if is_tracked(name) and module_path(name) is not None]
+
+
+def inputs_hash(client) -> str:
+    datasources = sorted((ds.get("uid"), ds.get("name"), ds.get("type")) for ds in client.find_datasources())
+    folders = sorted((folder.get("uid"), folder.get("title")) for folder in client.find_folders())
+    return content_hash({
+        "datasources": datasources,
+        "folders": folders,
+        "distributions": {name: distribution_version(name) for name in TRACKED_DISTRIBUTIONS}
+    })
+
+
+def distribution_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
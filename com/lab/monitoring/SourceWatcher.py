@@ -0,0 +1,133 @@
+import importlib
+import os
+import sys
+import time
+
+from com.lab.monitoring.DashboardGroups import group_builders
+from com.lab.monitoring.SourceTracker import imported_modules, module_path, SourceTracker
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.util.Util import log_info, log_debug
+
+# These modules hold the classes and state of the provisioning run itself: the model classes the client checks objects
+# against, its exceptions, the shared fragment cache and the streamed bodies. Reloading them would leave the warm
+# client and the objects built so far with classes of the old code, so a change needs a restart. The modules directly
+# in RUNTIME_PACKAGE, the client and the provisioning runtime, are restarted as well. Other modules, like the query
+# helpers of com.lab.monitoring.util.Util, are reloaded like builder modules.
+RESTART_PACKAGES = ("com.lab.grafanalib", "com.lab.monitoring.model", "com.lab.monitoring.exception")
+RESTART_MODULES = ("com.lab.monitoring.util.FragmentCache", "com.lab.monitoring.util.JsonUtil")
+RUNTIME_PACKAGE = "com.lab.monitoring"
+
+
+class SourceWatcher:
+    """Polls the source files of the dashboard builders of some groups and reloads the modules that changed.
+
+    The watched files are the builder modules and every com.lab module they import, as found by SourceTracker. Files
+    are compared by modification time and size, so polling costs one stat() per module and no extra dependency.
+    """
+
+    def __init__(self, group_names: [str], source_tracker: SourceTracker, debounce_seconds=0.2):
+        self.group_names = group_names
+        self.source_tracker = source_tracker
+        self.debounce_seconds = debounce_seconds
+        self.modules = {}
+        self.refresh()
+
+    def refresh(self):
+        """Recomputes the watched modules, which change when a reloaded module imports other modules."""
+        modules = set()
+        for group_name in self.group_names:
+            for module_name in {builder.__module__ for builder in group_builders(group_name)}:
+                modules |= self.source_tracker.module_closure(module_name)
+        self.modules = {module_name: self.modules.get(module_name) or file_signature(module_name)
+                        for module_name in modules}
+        log_debug("Watching %d modules", len(self.modules))
+
+    def changed_modules(self) -> [str]:
+        changed = self.poll()
+        while changed:
+            # Editors save in several writes; wait until the files are quiet.
+            time.sleep(self.debounce_seconds)
+            more = self.poll()
+            if not more:
+                break
+            changed |= more
+        return sorted(changed)
+
+    def poll(self) -> set:
+        changed = set()
+        for module_name, signature in self.modules.items():
+            current = file_signature(module_name)
+            if current != signature:
+                self.modules[module_name] = current
+                changed.add(module_name)
+        return changed
+
+    def reload(self, changed: [str]):
+        """Reloads the changed modules and the watched modules importing them, dependencies first.
+
+        Restart modules importing a changed helper keep running with the version they imported. A module that fails to
+        import keeps its previous version loaded; the errors are raised as a ProvisioningException after the other
+        modules were reloaded.
+        """
+        self.source_tracker.invalidate(changed)
+        imports = {module_name: set(imported_modules(module_name)) & self.modules.keys()
+                   for module_name in self.modules}
+        affected = set(changed)
+        pending = list(changed)
+        while pending:
+            module_name = pending.pop()
+            for importer, imported in imports.items():
+                if module_name in imported and importer not in affected and not is_restart_module(importer):
+                    affected.add(importer)
+                    pending.append(importer)
+        errors = []
+        for module_name in reload_order(affected, imports):
+            module = sys.modules.get(module_name)
+            if module is None:
+                continue
+            try:
+                importlib.reload(module)
+            except Exception as e:
+                errors.append(f"{module_name}: {e}")
+        log_info(f"Reloaded {len(affected) - len(errors)} modules after changes to {', '.join(changed)}")
+        self.refresh()
+        if errors:
+            raise ProvisioningException(f"Reloading failed - {'; '.join(errors)}")
+
+
+def file_signature(module_name):
+    path = module_path(module_name)
+    try:
+        stat = os.stat(path) if path is not None else None
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+
+
+def restart_modules(module_names: [str]) -> [str]:
+    """Returns the modules whose changes cannot be reloaded, see RESTART_PACKAGES."""
+    return [module_name for module_name in module_names if is_restart_module(module_name)]
+
+
+def is_restart_module(module_name) -> bool:
+    return module_name in RESTART_MODULES or module_name.rpartition(".")[0] == RUNTIME_PACKAGE or \
+        any(module_name == package or module_name.startswith(f"{package}.") for package in RESTART_PACKAGES)
+
+
+def reload_order(modules: set, imports: dict) -> [str]:
+    """Orders the modules so that every module comes after the modules it imports."""
+    ordered = []
+    visited = set()
+
+    def visit(module_name):
+        if module_name in visited:
+            return
+        visited.add(module_name)
+        for imported in sorted(imports.get(module_name, ())):
+            if imported in modules:
+                visit(imported)
+        ordered.append(module_name)
+
+    for module_name in sorted(modules):
+        visit(module_name)
+    return ordered
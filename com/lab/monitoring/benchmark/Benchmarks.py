@@ -0,0 +1,182 @@
+import json
+import os
+import platform
+import statistics
+import time
+
+from com.lab.grafanalib.core import NotificationPolicyRoute
+from com.lab.monitoring.DashboardProvisioner import DashboardProvisioner
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.MetadataCache import MetadataCache
+from com.lab.monitoring.RunMetrics import RunMetrics
+from com.lab.monitoring.benchmark.DashboardGenerator import generate_dashboard, generate_group, generate_policy_tree
+from com.lab.monitoring.benchmark.StubGrafanaServer import StubGrafanaServer
+from com.lab.monitoring.model.NotificationPolicyTree import NotificationPolicyTree, PolicyLayout
+from com.lab.monitoring.util.JsonUtil import to_json_data
+from com.lab.monitoring.util.ModelValidation import model_validation
+from com.lab.monitoring.util.Util import log_info
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, params: dict, seconds: [float], items: int, unit: str, extra: dict = None):
+        self.name: str = name
+        self.params: dict = params
+        self.seconds: [float] = seconds
+        self.items: int = items
+        self.unit: str = unit
+        self.extra: dict = extra if extra is not None else {}
+
+    @property
+    def key(self) -> str:
+        return self.name + "".join(f"[{key}={value}]" for key, value in sorted(self.params.items()))
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.seconds)
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.median if self.median > 0 else 0.0
+
+    def to_json_data(self):
+        return {
+            "name": self.name,
+            "params": self.params,
+            "median_seconds": round(self.median, 6),
+            "min_seconds": round(min(self.seconds), 6),
+            "max_seconds": round(max(self.seconds), 6),
+            "repeats": len(self.seconds),
+            "throughput": round(self.throughput, 3),
+            "unit": self.unit,
+            "extra": self.extra
+        }
+
+
+def measure(function, repeats: int) -> [float]:
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def benchmark_serialization(panel_count: int, repeats: int) -> BenchmarkResult:
+    """Encodes one dashboard of panel_count panels with its alert rules, the work save_dashboard does per upload."""
+    bundle = generate_dashboard("serialize", panel_count)
+    size = len(to_json_data(bundle.dashboard_wrapper)) + len(to_json_data(bundle.alert_rules))
+
+    def serialize():
+        to_json_data(bundle.dashboard_wrapper)
+        to_json_data(bundle.alert_rules)
+
+    seconds = measure(serialize, repeats)
+    return BenchmarkResult("serialization", {"panels": panel_count}, seconds, size, "bytes/s",
+                           {"bytes": size})
+
+
+def benchmark_render(panel_count: int, repeats: int, trusted=False) -> BenchmarkResult:
+    """Builds the attrs objects of one dashboard of panel_count panels, the work of a dashboard builder.
+
+    trusted builds without attrs validation, as with TRUSTED_MODELS.
+    """
+    with model_validation(not trusted):
+        seconds = measure(lambda: generate_dashboard("render", panel_count), repeats)
+    return BenchmarkResult("render_trusted" if trusted else "render", {"panels": panel_count}, seconds, panel_count,
+                           "panels/s")
+
+
+def benchmark_provisioning(dashboard_count: int, panel_count: int, latency: float, error_rate: float,
+                           workers: int, repeats: int) -> BenchmarkResult:
+    """Provisions a synthetic group end to end against a stub Grafana: dashboards, alert rule groups and policies."""
+    bundles = generate_group(dashboard_count, panel_count)
+    alert_rules = [alert_rule for bundle in bundles for alert_rule in bundle.alert_rules]
+    routes = [route for bundle in bundles for route in bundle.notification_policy_routes]
+    seconds = []
+    requests = 0
+    with StubGrafanaServer(latency=latency, error_rate=error_rate) as server:
+        for _ in range(repeats):
+            server.dashboards.clear()
+            server.rule_groups.clear()
+            server.policies = {"receiver": "default", "routes": []}
+            requests_before = server.requests
+            metrics = RunMetrics()
+            with GrafanaClient(server.url, "benchmark", pool_size=workers, backoff_factor=0,
+                               metadata_cache=MetadataCache(), metrics=metrics) as client:
+                provisioner = DashboardProvisioner(client, workers)
+                start = time.perf_counter()
+                provisioner.provision([bundle.dashboard_wrapper for bundle in bundles])
+                client.add_alert_rules(alert_rules)
+                client.add_notification_policy_routes(routes)
+                seconds.append(time.perf_counter() - start)
+            requests = server.requests - requests_before
+    return BenchmarkResult("provisioning",
+                           {"dashboards": dashboard_count, "panels": panel_count, "latency": latency,
+                            "error_rate": error_rate, "workers": workers},
+                           seconds, dashboard_count, "dashboards/s", {"requests": requests})
+
+
+def benchmark_policy_tree(dashboard_count: int, rules_per_dashboard: int, layout: PolicyLayout,
+                          repeats: int) -> BenchmarkResult:
+    """Loads a large tree, upserts one dashboard's routes, removes another dashboard and serializes the tree."""
+    tree_json = json.loads(to_json_data(generate_policy_tree(dashboard_count, rules_per_dashboard, layout)))
+    # Half of the routes are unchanged, the other half are new rules of the same dashboard.
+    updates = [NotificationPolicyRoute(receiver="default", rule_uid=f"tree-0-rule-{rule_index}",
+                                       dashboard_uid="tree-0")
+               for rule_index in range(rules_per_dashboard * 2)]
+
+    def update():
+        tree = NotificationPolicyTree(json.loads(json.dumps(tree_json)), layout)
+        tree.upsert_routes(updates)
+        tree.remove_dashboard(f"tree-{dashboard_count - 1}")
+        to_json_data(tree)
+
+    seconds = measure(update, repeats)
+    return BenchmarkResult("policy_tree",
+                           {"dashboards": dashboard_count, "rules": rules_per_dashboard, "layout": layout.value},
+                           seconds, dashboard_count * rules_per_dashboard, "routes/s")
+
+
+def run_suite(panel_sizes: [int], dashboard_count: int, latency: float, error_rate: float, workers: int,
+              repeats: int) -> [BenchmarkResult]:
+    results = []
+    for panel_count in panel_sizes:
+        results.append(benchmark_render(panel_count, repeats))
+        results.append(benchmark_render(panel_count, repeats, trusted=True))
+        results.append(benchmark_serialization(panel_count, repeats))
+    results.append(benchmark_provisioning(dashboard_count, min(panel_sizes), latency, error_rate, workers, repeats))
+    for layout in PolicyLayout:
+        results.append(benchmark_policy_tree(dashboard_count * 10, 10, layout, repeats))
+    for result in results:
+        log_info(f"{result.key}: median {result.median * 1000:.1f}ms, {result.throughput:,.1f} {result.unit}")
+    return results
+
+
+def save_results(path, results: [BenchmarkResult]):
+    report = {
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": {result.key: result.to_json_data() for result in results}
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(report, f, sort_keys=True, indent=2)
+    log_info(f"Benchmark results written to {path}")
+
+
+def compare_results(baseline_path, results: [BenchmarkResult], tolerance: float) -> [str]:
+    """Returns the keys of benchmarks whose median time grew by more than tolerance (0.1 = 10%) over the baseline."""
+    with open(baseline_path, encoding="utf8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for result in results:
+        if result.key not in baseline:
+            continue
+        before = baseline[result.key]["median_seconds"]
+        change = (result.median - before) / before if before > 0 else 0.0
+        log_info(f"{result.key}: {before * 1000:.1f}ms -> {result.median * 1000:.1f}ms ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(result.key)
+    return regressions
@@ -0,0 +1,91 @@
+from grafanalib.core import Dashboard, GridPos, GreaterThan, OP_AND, RTYPE_LAST
+
+from com.lab.grafanalib.core import DashboardWrapper, RowPanel, CustomStat, AlertRule, AlertCondition, \
+    NotificationPolicyRoute, StatMappingValue
+from com.lab.grafanalib.zabbix import ZabbixTarget, ZabbixTargetOptions
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+from com.lab.monitoring.model.NotificationPolicyTree import NotificationPolicyTree, PolicyLayout
+from com.lab.monitoring.util.FragmentCache import fragment_cache
+
+PANELS_PER_ROW = 12
+STATS_PER_LINE = 6
+STAT_WIDTH = 4
+STAT_HEIGHT = 4
+
+
+def generate_dashboard(uid, panel_count, alert_ratio=0.1, folder_uid="benchmark", datasource_uid="zabbix",
+                       receiver="default") -> DashboardBundle:
+    """Builds a synthetic dashboard of panel_count CustomStat panels with Zabbix targets, grouped in rows.
+
+    Every 1/alert_ratio-th panel gets an AlertRule and a NotificationPolicyRoute, like the alerting panels of a group.
+    """
+    alert_every = round(1 / alert_ratio) if alert_ratio > 0 else 0
+    rows = []
+    alert_rules = []
+    routes = []
+    for row_index in range((panel_count + PANELS_PER_ROW - 1) // PANELS_PER_ROW):
+        panels = []
+        first = row_index * PANELS_PER_ROW
+        for panel_index in range(first, min(first + PANELS_PER_ROW, panel_count)):
+            target = generate_target(uid, panel_index)
+            panels.append(CustomStat(
+                title=f"Stat {panel_index}",
+                dataSource=datasource_uid,
+                targets=[target],
+                gridPos=GridPos(h=STAT_HEIGHT, w=STAT_WIDTH, x=(panel_index % STATS_PER_LINE) * STAT_WIDTH,
+                                y=(panel_index // STATS_PER_LINE) * STAT_HEIGHT),
+                reduceCalc="lastNotNull",
+                mappings=generate_mappings()
+            ))
+            if alert_every and panel_index % alert_every == 0:
+                alert_rule = generate_alert_rule(uid, panel_index, target, folder_uid, datasource_uid)
+                alert_rules.append(alert_rule)
+                routes.append(NotificationPolicyRoute(receiver=receiver, rule_uid=alert_rule.get_uid(),
+                                                      dashboard_uid=uid))
+        rows.append(RowPanel(title=f"Row {row_index}", panels=panels,
+                             gridPos=GridPos(h=1, w=24, x=0, y=row_index)))
+
+    dashboard = Dashboard(title=f"Benchmark {uid}", uid=uid, panels=rows).auto_panel_ids()
+    return DashboardBundle(DashboardWrapper(dashboard=dashboard, folderUid=folder_uid), alert_rules, routes)
+
+
+def generate_mappings() -> [StatMappingValue]:
+    return [fragment_cache.fragment(StatMappingValue, "0", "DOWN", "red", 0),
+            fragment_cache.fragment(StatMappingValue, "1", "UP", "green", 1)]
+
+
+def generate_target(dashboard_uid, panel_index) -> ZabbixTarget:
+    return ZabbixTarget(group="Benchmark", host=f"{dashboard_uid}-host-{panel_index % 10}",
+                        application="Benchmark", item=f"/item\\.{panel_index}$/", refId="A",
+                        options=ZabbixTargetOptions(showDisabledItems=False))
+
+
+def generate_alert_rule(dashboard_uid, panel_index, target, folder_uid, datasource_uid) -> AlertRule:
+    return AlertRule(
+        alertConditions=[AlertCondition(target=target, evaluator=GreaterThan(90), operator=OP_AND,
+                                        reducerType=RTYPE_LAST)],
+        folderUid=folder_uid,
+        title=f"Stat {panel_index} too high",
+        datasourceUid=datasource_uid,
+        message=f"Stat {panel_index} of {dashboard_uid} is above 90",
+        dashboardUid=dashboard_uid,
+        panelUid=str(panel_index),
+        target=target
+    )
+
+
+def generate_group(dashboard_count, panel_count, alert_ratio=0.1, uid_prefix="bench") -> [DashboardBundle]:
+    return [generate_dashboard(f"{uid_prefix}-{index}", panel_count, alert_ratio) for index in range(dashboard_count)]
+
+
+def generate_policy_tree(dashboard_count, rules_per_dashboard, layout: PolicyLayout = PolicyLayout.FLAT,
+                         receiver="default") -> NotificationPolicyTree:
+    """Builds a policy tree holding the routes of dashboard_count dashboards with rules_per_dashboard rules each."""
+    tree = NotificationPolicyTree({"receiver": receiver, "routes": []}, layout)
+    for dashboard_index in range(dashboard_count):
+        dashboard_uid = f"tree-{dashboard_index}"
+        tree.upsert_routes(NotificationPolicyRoute(receiver=receiver, rule_uid=f"{dashboard_uid}-rule-{rule_index}",
+                                                   dashboard_uid=dashboard_uid)
+                           for rule_index in range(rules_per_dashboard))
+    tree.dirty = False
+    return tree
@@ -0,0 +1,248 @@
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+ZABBIX_DATASOURCE_TYPE = "alexanderzobnin-zabbix-datasource"
+
+
+class StubGrafanaServer:
+    """In-memory stand-in for the Grafana HTTP API endpoints used by GrafanaClient, for benchmarks.
+
+    Every request is delayed by latency seconds plus a random jitter, and fails with error_status (and a Retry-After
+    header for 429) with probability error_rate. Conditional metadata requests are answered with 304 when the ETag
+    matches. The random generator is seeded, so error injection is reproducible between runs.
+
+        with StubGrafanaServer(latency=0.02) as server:
+            client = GrafanaClient(server.url, "benchmark")
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=None, seed=0,
+                 datasources=None, folders=None, contact_points=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.dashboards = {}
+        self.rule_groups = {}
+        self.policies = {"receiver": "default", "routes": []}
+        self.metadata = {
+            "api/datasources": datasources if datasources is not None else [
+                {"id": 1, "uid": "zabbix", "name": "Zabbix", "type": ZABBIX_DATASOURCE_TYPE}],
+            "api/folders": folders if folders is not None else [{"id": 1, "uid": "benchmark", "title": "Benchmark"}],
+            "api/v1/provisioning/contact-points": contact_points if contact_points is not None else [
+                {"uid": "default", "name": "default", "type": "email"}]
+        }
+        self.requests = 0
+        self.injected_errors = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(self))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stub-grafana", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def delay(self):
+        with self.lock:
+            self.requests += 1
+            pause = self.latency + (self.random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+            inject_error = self.error_rate > 0 and self.random.random() < self.error_rate
+            if inject_error:
+                self.injected_errors += 1
+        if pause > 0:
+            time.sleep(pause)
+        return inject_error
+
+    def handle(self, method, path, body, query=None):
+        """Returns (status, json body, extra headers) of a request, path without the leading slash and query."""
+        query = query or {}
+        with self.lock:
+            if method == "GET" and path in self.metadata:
+                return 200, paginate(self.metadata[path], query), {}
+            if method == "GET" and path == "api/search":
+                return 200, paginate([{"uid": uid, "title": dashboard.get("title"), "type": "dash-db"}
+                                      for uid, dashboard in sorted(self.dashboards.items())], query), {}
+            if method == "POST" and path in ("api/folders", "api/v1/provisioning/contact-points"):
+                self.metadata[path].append(body)
+                return (200 if path == "api/folders" else 202), body, {}
+            match = re.fullmatch(r"api/folders/([^/]+)", path)
+            if match:
+                folder = next((folder for folder in self.metadata["api/folders"] if folder["uid"] == match.group(1)),
+                              None)
+                return (200, folder, {}) if folder is not None else (404, {"message": "Folder not found"}, {})
+            if path == "api/dashboards/db" and method == "POST":
+                dashboard = body["dashboard"]
+                version = self.dashboards.get(dashboard["uid"], {}).get("version", 0) + 1
+                self.dashboards[dashboard["uid"]] = dict(dashboard, version=version)
+                return 200, {"status": "success", "uid": dashboard["uid"], "version": version}, {}
+            match = re.fullmatch(r"api/dashboards/uid/([^/]+)", path)
+            if match:
+                return self.handle_dashboard(method, match.group(1))
+            if path == "api/v1/provisioning/alert-rules":
+                return self.handle_alert_rules(method, body)
+            match = re.fullmatch(r"api/v1/provisioning/alert-rules/([^/]+)", path)
+            if match:
+                return self.handle_alert_rule(method, match.group(1), body)
+            match = re.fullmatch(r"api/v1/provisioning/folder/([^/]+)/rule-groups/([^/]+)", path)
+            if match:
+                return self.handle_rule_group(method, (match.group(1), unquote(match.group(2))), body)
+            if path == "api/v1/provisioning/policies":
+                if method == "PUT":
+                    self.policies = body
+                    return 202, {"message": "policies updated"}, {}
+                return 200, self.policies, {}
+        return 404, {"message": "Not found"}, {}
+
+    def handle_dashboard(self, method, uid):
+        if uid not in self.dashboards:
+            return 404, {"message": "Dashboard not found"}, {}
+        if method == "DELETE":
+            del self.dashboards[uid]
+            return 200, {"title": uid, "message": "Dashboard deleted"}, {}
+        return 200, {"dashboard": self.dashboards[uid], "meta": {"folderUid": "benchmark"}}, {}
+
+    def handle_alert_rules(self, method, body):
+        if method == "POST":
+            self.store_rule(body)
+            return 201, body, {}
+        return 200, [rule for group in self.rule_groups.values() for rule in group["rules"]], {}
+
+    def handle_alert_rule(self, method, uid, body):
+        key, rule = self.find_rule(uid)
+        if rule is None:
+            return 404, {"message": "Alert rule not found"}, {}
+        if method == "GET":
+            return 200, rule, {}
+        self.rule_groups[key]["rules"].remove(rule)
+        if method == "PUT":
+            self.store_rule(body)
+            return 200, body, {}
+        return 204, None, {}
+
+    def handle_rule_group(self, method, key, body):
+        if method == "PUT":
+            rules = [dict(rule, folderUID=key[0], ruleGroup=key[1]) for rule in body.get("rules", [])]
+            self.rule_groups[key] = dict(body, rules=rules)
+            return 200, self.rule_groups[key], {}
+        if key not in self.rule_groups:
+            return 404, {"message": "Rule group not found"}, {}
+        if method == "DELETE":
+            del self.rule_groups[key]
+            return 204, None, {}
+        return 200, self.rule_groups[key], {}
+
+    def find_rule(self, uid):
+        for key, group in self.rule_groups.items():
+            for rule in group["rules"]:
+                if rule["uid"] == uid:
+                    return key, rule
+        return None, None
+
+    def store_rule(self, rule):
+        key = (rule["folderUID"], rule["ruleGroup"])
+        group = self.rule_groups.setdefault(key, {"title": key[1], "folderUid": key[0], "interval": 60, "rules": []})
+        group["rules"].append(rule)
+
+
+def paginate(items, query: dict):
+    if "limit" not in query:
+        return items
+    limit = int(query["limit"])
+    start = (int(query.get("page", 1)) - 1) * limit
+    return items[start:start + limit]
+
+
+def stub_handler(server: StubGrafanaServer):
+    class StubGrafanaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.dispatch("GET")
+
+        def do_POST(self):
+            self.dispatch("POST")
+
+        def do_PUT(self):
+            self.dispatch("PUT")
+
+        def do_DELETE(self):
+            self.dispatch("DELETE")
+
+        def dispatch(self, method):
+            body = self.read_body()
+            if server.delay():
+                headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+                self.respond(server.error_status, {"message": "Injected error"}, headers)
+                return
+            url = urlsplit(self.path)
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            status, content, headers = server.handle(method, url.path.lstrip("/"), body, query)
+            self.respond(status, content, headers)
+
+        def read_body(self):
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                content = self.read_chunked()
+            else:
+                content = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not content:
+                return None
+            if self.headers.get("Content-Encoding") == "gzip":
+                content = gzip.decompress(content)
+            return json.loads(content.decode("utf8"))
+
+        def read_chunked(self):
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+
+        def respond(self, status, content, headers):
+            payload = json.dumps(content).encode("utf8") if content is not None else b""
+            etag = f'"{hashlib.sha256(payload).hexdigest()[:16]}"'
+            if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+                status, payload = 304, b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if self.command == "GET":
+                self.send_header("ETag", etag)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubGrafanaHandler
@@ -0,0 +1,113 @@
+import json
+
+from com.lab.grafanalib.core import AlertRule
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.util.JsonUtil import to_canonical_json, is_subset
+
+DEFAULT_INTERVAL_SECONDS = 60
+
+
+class AlertRuleGroup:
+    def __init__(self, folder_uid: str, title: str, interval: int = DEFAULT_INTERVAL_SECONDS, rules=None):
+        self.folder_uid: str = folder_uid
+        self.title: str = title
+        self.interval: int = interval
+        self.rules: list = rules if rules is not None else []
+
+    def rule_uids(self) -> [str]:
+        return [rule_uid(rule) for rule in self.rules]
+
+    def upsert_rules(self, alert_rules: [AlertRule]) -> int:
+        """Replaces or adds the given rules and returns how many of them differ from the stored ones.
+
+        Rules are AlertRules or their rendered JSON data.
+        """
+        existing = {rule_uid(rule): rule for rule in self.rules}
+        changed = sum(1 for alert_rule in alert_rules
+                      if not is_unchanged(alert_rule, existing.get(rule_uid(alert_rule))))
+        new_uids = {rule_uid(alert_rule) for alert_rule in alert_rules}
+        self.rules = [rule for rule in self.rules if rule_uid(rule) not in new_uids] + list(alert_rules)
+        return changed
+
+    def remove_rules(self, alert_rule_uids) -> int:
+        before = len(self.rules)
+        self.rules = [rule for rule in self.rules if rule_uid(rule) not in alert_rule_uids]
+        return before - len(self.rules)
+
+    def to_json_data(self):
+        return {
+            "title": self.title,
+            "folderUid": self.folder_uid,
+            "interval": self.interval,
+            "rules": self.rules
+        }
+
+
+def rule_uid(rule) -> str:
+    return rule.get_uid() if isinstance(rule, AlertRule) else rule["uid"]
+
+
+def rule_title(rule) -> str:
+    return rule.title if isinstance(rule, AlertRule) else rule["title"]
+
+
+def is_unchanged(alert_rule: AlertRule, provisioned_rule) -> bool:
+    """Grafana adds server-side fields (id, updated, provenance, ...) to stored rules, so a rule is unchanged when
+    every field it renders is stored with the same value."""
+    if provisioned_rule is None or isinstance(provisioned_rule, AlertRule):
+        return False
+    rendered = alert_rule if isinstance(alert_rule, dict) else json.loads(to_canonical_json(alert_rule))
+    return is_subset(rendered, provisioned_rule)
+
+
+def from_json(json_data) -> AlertRuleGroup:
+    return AlertRuleGroup(json_data['folderUid'], json_data['title'],
+                          json_data.get('interval', DEFAULT_INTERVAL_SECONDS), json_data.get('rules', []))
+
+
+def group_alert_rules(alert_rules: [AlertRule]) -> dict:
+    """Groups alert rules by (folderUid, ruleGroup), the unit the rule-group provisioning endpoint writes.
+
+    Raises a ProvisioningException when two of the rules have the same uid, which happens when a builder creates two
+    rules for the same dashboard, panel and title: the second would silently replace the first. Such rules need
+    different ruleKeys.
+    """
+    groups = {}
+    seen = {}
+    for alert_rule in alert_rules:
+        uid = rule_uid(alert_rule)
+        if uid in seen and seen[uid] is not alert_rule:
+            raise ProvisioningException(f"Two alert rules have the same uid {uid} [title: {rule_title(alert_rule)}], "
+                                        f"set a different ruleKey on each")
+        seen[uid] = alert_rule
+        if isinstance(alert_rule, dict):
+            key = (alert_rule["folderUID"], alert_rule["ruleGroup"])
+        else:
+            key = (alert_rule.folderUid, alert_rule.get_rule_group())
+        groups.setdefault(key, []).append(alert_rule)
+    return groups
+
+
+def stale_rule_uids(provisioned_rules, alert_rules: [AlertRule], dashboard_uids) -> dict:
+    """Groups by (folderUID, ruleGroup) the uids of the provisioned rules (as listed by Grafana) of the dashboards that
+    are not among alert_rules, or stored in another rule group: rules renamed or removed from their builder."""
+    dashboard_uids = {dashboard_uid for dashboard_uid in dashboard_uids if dashboard_uid}
+    rendered = {rule_uid(alert_rule): key
+                for key, rules in group_alert_rules(alert_rules).items() for alert_rule in rules}
+    groups = {}
+    for rule in provisioned_rules:
+        labels = rule.get("labels") or {}
+        key = (rule["folderUID"], rule["ruleGroup"])
+        if labels.get("rule_uid") and labels.get("dashboard_uid") in dashboard_uids and \
+                rendered.get(rule["uid"]) != key:
+            groups.setdefault(key, set()).add(rule["uid"])
+    return groups
+
+
+def group_rule_uids(provisioned_rules, alert_rule_uids) -> dict:
+    """Groups the uids of provisioned rules (as listed by Grafana) by (folderUID, ruleGroup)."""
+    groups = {}
+    for rule in provisioned_rules:
+        if rule["uid"] in alert_rule_uids:
+            groups.setdefault((rule["folderUID"], rule["ruleGroup"]), set()).add(rule["uid"])
+    return groups
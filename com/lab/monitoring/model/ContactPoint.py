@@ -1,3 +1,9 @@
 class ContactPoint:
-    def __init__(self, name: str):
+    def __init__(self, name: str, uid: str = None, type: str = None):
         self.name: str = name
+        self.uid: str = uid
+        self.type: str = type
+
+
+def from_json(json_data) -> ContactPoint:
+    return ContactPoint(json_data['name'], json_data.get('uid'), json_data.get('type'))
@@ -0,0 +1,20 @@
+from com.lab.grafanalib.core import DashboardWrapper, AlertRule, NotificationPolicyRoute
+
+
+class DashboardBundle:
+    """Everything a dashboard builder produces: the dashboard, its alert rules and their notification policy routes."""
+
+    def __init__(self, dashboard_wrapper: DashboardWrapper, alert_rules: [AlertRule] = None,
+                 notification_policy_routes: [NotificationPolicyRoute] = None):
+        self.dashboard_wrapper: DashboardWrapper = dashboard_wrapper
+        self.alert_rules: [AlertRule] = alert_rules if alert_rules is not None else []
+        self.notification_policy_routes: [NotificationPolicyRoute] = notification_policy_routes \
+            if notification_policy_routes is not None else []
+
+    @property
+    def uid(self) -> str:
+        return self.dashboard_wrapper.dashboard.uid
+
+    @property
+    def title(self) -> str:
+        return self.dashboard_wrapper.dashboard.title
@@ -2,3 +2,11 @@ class Folder:
     def __init__(self, uid: str, title: str):
         self.uid: str = uid
         self.title: str = title
+
+    @property
+    def name(self) -> str:
+        return self.title
+
+
+def from_json(json_data) -> Folder:
+    return Folder(json_data['uid'], json_data['title'])
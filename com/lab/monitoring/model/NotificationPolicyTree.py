@@ -0,0 +1,234 @@
+import json
+import threading
+from enum import Enum
+
+from com.lab.grafanalib.core import NotificationPolicyRoute
+from com.lab.monitoring.util.JsonUtil import to_canonical_json, is_subset
+
+
+class PolicyLayout(Enum):
+    # Every rule route is a direct child of the root policy, matching on rule_uid and dashboard_uid.
+    FLAT = "flat"
+    # One parent route per dashboard_uid, with one child route per rule_uid inside it.
+    NESTED = "nested"
+
+
+class NotificationPolicyTree:
+    """Notification policy tree with the provisioned routes indexed by rule and dashboard uid.
+
+    Routes created from NotificationPolicyRoute are keyed by their rule_uid matcher, so adding a route again replaces
+    it in place and removing the routes of a dashboard is a dictionary lookup. Other routes (e.g. created by hand) are
+    kept untouched and in their original order. Load the tree once, apply all changes and save it once when dirty.
+
+    New routes are written in the given layout; routes stored in the other layout are still indexed and are moved when
+    they are upserted, or all at once with migrate().
+    """
+
+    def __init__(self, policies: dict, layout: PolicyLayout = PolicyLayout.FLAT):
+        self.policies = policies
+        self.layout = layout
+        self.routes = {}
+        self.nested_routes = {}
+        self.rule_dashboard_uids = {}
+        self.rule_uids_by_dashboard_uid = {}
+        self.dirty = False
+        self.lock = threading.RLock()
+        for index, route in enumerate(policies.get("routes") or []):
+            rule_uid = get_matcher_value(route, "rule_uid")
+            if rule_uid is not None:
+                self.index_flat_route(rule_uid, route)
+            elif is_dashboard_route(route):
+                self.index_dashboard_route(route)
+            else:
+                self.routes[("route", index)] = route
+
+    def index_flat_route(self, rule_uid, route):
+        self.routes[rule_uid] = route
+        self.index_rule(rule_uid, get_matcher_value(route, "dashboard_uid"))
+
+    def index_dashboard_route(self, route):
+        dashboard_uid = get_matcher_value(route, "dashboard_uid")
+        self.routes[dashboard_key(dashboard_uid)] = {key: value for key, value in route.items() if key != "routes"}
+        children = self.nested_routes.setdefault(dashboard_uid, {})
+        for child in route.get("routes") or []:
+            rule_uid = get_matcher_value(child, "rule_uid")
+            children[rule_uid] = child
+            self.index_rule(rule_uid, dashboard_uid)
+
+    def index_nested_route(self, rule_uid, dashboard_uid, route):
+        if dashboard_key(dashboard_uid) not in self.routes:
+            self.routes[dashboard_key(dashboard_uid)] = {"object_matchers": [["dashboard_uid", "=", dashboard_uid]]}
+        self.nested_routes.setdefault(dashboard_uid, {})[rule_uid] = route
+        self.index_rule(rule_uid, dashboard_uid)
+
+    def index_rule(self, rule_uid, dashboard_uid):
+        self.rule_dashboard_uids[rule_uid] = dashboard_uid
+        if dashboard_uid is not None:
+            self.rule_uids_by_dashboard_uid.setdefault(dashboard_uid, {})[rule_uid] = None
+
+    def unindex_rule(self, rule_uid):
+        """Removes the route of the rule wherever it is stored and returns it."""
+        if rule_uid not in self.rule_dashboard_uids:
+            return None
+        dashboard_uid = self.rule_dashboard_uids.pop(rule_uid)
+        rule_uids = self.rule_uids_by_dashboard_uid.get(dashboard_uid, {})
+        rule_uids.pop(rule_uid, None)
+        if not rule_uids:
+            self.rule_uids_by_dashboard_uid.pop(dashboard_uid, None)
+        route = self.routes.pop(rule_uid, None)
+        if route is None:
+            children = self.nested_routes.get(dashboard_uid, {})
+            route = children.pop(rule_uid, None)
+            if not children:
+                self.remove_dashboard_route(dashboard_uid)
+        return route
+
+    def remove_dashboard_route(self, dashboard_uid):
+        self.nested_routes.pop(dashboard_uid, None)
+        self.routes.pop(dashboard_key(dashboard_uid), None)
+
+    def find_route(self, rule_uid):
+        if rule_uid in self.routes:
+            return self.routes[rule_uid], PolicyLayout.FLAT
+        dashboard_uid = self.rule_dashboard_uids.get(rule_uid)
+        route = self.nested_routes.get(dashboard_uid, {}).get(rule_uid)
+        return route, PolicyLayout.NESTED if route is not None else None
+
+    def upsert_route(self, route) -> bool:
+        """Adds or replaces the route of its rule, returns True when the tree changed."""
+        route = to_route_json(route)
+        rule_uid = get_matcher_value(route, "rule_uid")
+        if rule_uid is None:
+            raise ValueError(f"Notification policy route has no rule_uid matcher: {route}")
+        dashboard_uid = get_matcher_value(route, "dashboard_uid")
+        layout = self.layout if dashboard_uid is not None else PolicyLayout.FLAT
+        if layout == PolicyLayout.NESTED:
+            route = to_nested_route(route)
+        with self.lock:
+            existing, existing_layout = self.find_route(rule_uid)
+            if existing is not None and existing_layout == layout and \
+                    self.rule_dashboard_uids.get(rule_uid) == dashboard_uid and is_subset(route, existing):
+                return False
+            self.unindex_rule(rule_uid)
+            if layout == PolicyLayout.NESTED:
+                self.index_nested_route(rule_uid, dashboard_uid, route)
+            else:
+                self.index_flat_route(rule_uid, route)
+            self.dirty = True
+            return True
+
+    def upsert_routes(self, routes) -> int:
+        return sum(1 for route in routes if self.upsert_route(route))
+
+    def remove_rule(self, rule_uid) -> bool:
+        with self.lock:
+            removed = self.unindex_rule(rule_uid) is not None
+            self.dirty = self.dirty or removed
+            return removed
+
+    def remove_unlisted_routes(self, dashboard_uids, routes) -> [str]:
+        """Removes the routes of the dashboards whose rules are not among routes, which hold all the routes of these
+        dashboards, and returns their rule uids: the routes of rules renamed or removed from their builder."""
+        listed = {get_matcher_value(to_route_json(route), "rule_uid") for route in routes}
+        with self.lock:
+            rule_uids = [rule_uid for dashboard_uid in dashboard_uids if dashboard_uid
+                         for rule_uid in self.rule_uids_by_dashboard_uid.get(dashboard_uid, {})
+                         if rule_uid not in listed]
+            for rule_uid in rule_uids:
+                self.remove_rule(rule_uid)
+            return rule_uids
+
+    def remove_dashboard(self, dashboard_uid) -> [str]:
+        """Removes all routes of the dashboard and returns the uids of their alert rules."""
+        with self.lock:
+            rule_uids = list(self.rule_uids_by_dashboard_uid.pop(dashboard_uid, {}))
+            for rule_uid in rule_uids:
+                self.rule_dashboard_uids.pop(rule_uid, None)
+                self.routes.pop(rule_uid, None)
+            self.remove_dashboard_route(dashboard_uid)
+            self.dirty = self.dirty or bool(rule_uids)
+            return rule_uids
+
+    def migrate(self, layout: PolicyLayout) -> int:
+        """Moves every indexed rule route into the given layout in one pass, returns the number of moved routes."""
+        with self.lock:
+            self.layout = layout
+            moved = 0
+            for rule_uid, dashboard_uid in list(self.rule_dashboard_uids.items()):
+                route, route_layout = self.find_route(rule_uid)
+                if route_layout == layout or dashboard_uid is None:
+                    continue
+                self.unindex_rule(rule_uid)
+                if layout == PolicyLayout.NESTED:
+                    self.index_nested_route(rule_uid, dashboard_uid, to_nested_route(route))
+                else:
+                    self.index_flat_route(rule_uid, to_flat_route(route, dashboard_uid))
+                moved += 1
+            self.dirty = self.dirty or moved > 0
+            return moved
+
+    def rule_uids(self, dashboard_uid) -> [str]:
+        with self.lock:
+            return list(self.rule_uids_by_dashboard_uid.get(dashboard_uid, {}))
+
+    def dashboard_uids(self) -> [str]:
+        with self.lock:
+            return list(self.rule_uids_by_dashboard_uid)
+
+    def orphan_rule_uids(self, dashboard_uids, alert_rule_uids) -> [str]:
+        """Returns the rule uids of the routes whose dashboard or alert rule no longer exists.
+
+        Routes without a dashboard_uid, or with an empty one, only depend on their alert rule.
+        """
+        with self.lock:
+            return [rule_uid for rule_uid, dashboard_uid in self.rule_dashboard_uids.items()
+                    if rule_uid not in alert_rule_uids
+                    or (dashboard_uid and dashboard_uid not in dashboard_uids)]
+
+    def to_json_data(self):
+        with self.lock:
+            routes = []
+            for key, route in self.routes.items():
+                if is_dashboard_key(key):
+                    route = dict(route, routes=list(self.nested_routes.get(key[1], {}).values()))
+                routes.append(route)
+            return dict(self.policies, routes=routes)
+
+
+def dashboard_key(dashboard_uid):
+    return "dashboard", dashboard_uid
+
+
+def is_dashboard_key(key) -> bool:
+    return isinstance(key, tuple) and key[0] == "dashboard"
+
+
+def is_dashboard_route(route) -> bool:
+    """A dashboard parent route of the nested layout matches on dashboard_uid only and its children on rule_uid."""
+    matchers = route.get("object_matchers") or []
+    children = route.get("routes") or []
+    return len(matchers) == 1 and matchers[0][0] == "dashboard_uid" and len(children) > 0 and \
+        all(get_matcher_value(child, "rule_uid") is not None for child in children)
+
+
+def to_route_json(route) -> dict:
+    if isinstance(route, NotificationPolicyRoute):
+        return json.loads(to_canonical_json(route))
+    return route
+
+
+def to_nested_route(route) -> dict:
+    matchers = [matcher for matcher in route.get("object_matchers") or [] if matcher[0] != "dashboard_uid"]
+    return dict(route, object_matchers=matchers)
+
+
+def to_flat_route(route, dashboard_uid) -> dict:
+    matchers = [matcher for matcher in route.get("object_matchers") or [] if matcher[0] != "dashboard_uid"]
+    return dict(route, object_matchers=matchers + [["dashboard_uid", "=", dashboard_uid]])
+
+
+def get_matcher_value(notification_policy_route, label):
+    for matcher in notification_policy_route.get("object_matchers") or []:
+        if matcher[0] == label:
+            return matcher[2]
+    return None
@@ -0,0 +1,48 @@
+import json
+
+from com.lab.monitoring.model.DashboardBundle import DashboardBundle
+from com.lab.monitoring.util.JsonUtil import to_json_data
+
+
+class RenderedDashboard:
+    """The rendered JSON data of a grafanalib Dashboard, encoded like the Dashboard through to_json_data."""
+
+    def __init__(self, json_data: dict):
+        self.json_data: dict = json_data
+
+    @property
+    def uid(self) -> str:
+        return self.json_data.get("uid")
+
+    @property
+    def title(self) -> str:
+        return self.json_data.get("title")
+
+    def to_json_data(self):
+        return self.json_data
+
+
+class RenderedDashboardWrapper:
+    """The rendered JSON data of a DashboardWrapper, usable wherever a DashboardWrapper is uploaded or hashed."""
+
+    def __init__(self, json_data: dict):
+        self.dashboard = RenderedDashboard(json_data["dashboard"])
+        self.folderUid: str = json_data["folderUid"]
+        self.json_data: dict = json_data
+
+    def to_json_data(self):
+        return self.json_data
+
+
+class RenderedBundle(DashboardBundle):
+    """A DashboardBundle rendered to JSON data once, so it can be rewritten for and uploaded to several targets.
+
+    Alert rules and notification policy routes are kept as their JSON data, which AlertRuleGroup and
+    NotificationPolicyTree accept in place of the grafanalib objects.
+    """
+
+
+def render_bundle(bundle: DashboardBundle) -> RenderedBundle:
+    return RenderedBundle(RenderedDashboardWrapper(json.loads(to_json_data(bundle.dashboard_wrapper))),
+                          json.loads(to_json_data(bundle.alert_rules)),
+                          json.loads(to_json_data(bundle.notification_policy_routes)))
@@ -0,0 +1,166 @@
+from jsonschema import Draft7Validator
+
+# Schemas of the rendered JSON of DashboardBundles. They check the rendered output for what the attrs validators of
+# com.lab.grafanalib check on every object, so builders validated once in CI can run with TRUSTED_MODELS in production.
+
+STRING = {"type": "string"}
+INTEGER = {"type": "integer"}
+BOOLEAN = {"type": "boolean"}
+FILTER = {"type": "object", "required": ["filter"], "properties": {"filter": STRING}}
+MAPPING_RESULT = {"type": "object", "properties": {"text": STRING, "color": STRING}}
+
+DASHBOARD_WRAPPER_SCHEMA = {
+    "type": "object",
+    "required": ["dashboard", "folderUid", "overwrite", "message"],
+    "properties": {
+        "dashboard": {
+            "type": "object",
+            "required": ["title", "panels"],
+            "properties": {
+                "title": STRING,
+                "uid": {"type": ["string", "null"]},
+                "panels": {"type": "array", "items": {"$ref": "#/definitions/panel"}}
+            }
+        },
+        "folderUid": STRING,
+        "overwrite": BOOLEAN,
+        "message": STRING
+    },
+    "definitions": {
+        "panel": {
+            "type": "object",
+            "required": ["type"],
+            "properties": {
+                "type": STRING,
+                "title": STRING,
+                "collapsed": BOOLEAN,
+                "panels": {"type": "array", "items": {"$ref": "#/definitions/panel"}},
+                "targets": {"type": "array", "items": {"$ref": "#/definitions/target"}},
+                "fieldConfig": {
+                    "type": "object",
+                    "properties": {
+                        "defaults": {
+                            "type": "object",
+                            "properties": {"mappings": {"type": "array", "items": {"$ref": "#/definitions/mapping"}}}
+                        },
+                        "overrides": {"type": "array", "items": {"$ref": "#/definitions/override"}}
+                    }
+                },
+                "transformations": {"type": "array", "items": {"$ref": "#/definitions/transformation"}}
+            }
+        },
+        "target": {
+            "type": "object",
+            "properties": {
+                "application": FILTER,
+                "group": FILTER,
+                "host": FILTER,
+                "item": FILTER,
+                "intervalFactor": INTEGER,
+                "mode": {"enum": [0, 1, 2]},
+                "options": {"type": "object", "properties": {"showDisabledItems": BOOLEAN}},
+                "textFilter": STRING,
+                "useCaptureGroups": BOOLEAN,
+                "expr": STRING
+            }
+        },
+        "mapping": {
+            "anyOf": [
+                {
+                    "type": "object",
+                    "properties": {
+                        "type": {"const": "value"},
+                        "options": {"type": "object", "additionalProperties": MAPPING_RESULT}
+                    }
+                },
+                {
+                    "type": "object",
+                    "properties": {
+                        "type": {"const": "range"},
+                        "options": {"type": "object", "required": ["from", "to"],
+                                    "properties": {"from": INTEGER, "to": INTEGER, "result": MAPPING_RESULT}}
+                    }
+                },
+                {
+                    "type": "object",
+                    "properties": {
+                        "type": {"const": "special"},
+                        "options": {"type": "object", "properties": {"match": STRING, "result": MAPPING_RESULT}}
+                    }
+                }
+            ]
+        },
+        "override": {
+            "type": "object",
+            "properties": {
+                "matcher": {"type": "object", "properties": {"id": STRING, "options": STRING}},
+                "properties": {"type": "array", "items": {"type": "object", "properties": {"id": STRING}}}
+            }
+        },
+        "transformation": {
+            "type": "object",
+            "required": ["id"],
+            "properties": {"id": STRING, "options": {"type": "object"}}
+        }
+    }
+}
+
+ALERT_RULE_SCHEMA = {
+    "type": "object",
+    "required": ["uid", "orgID", "folderUID", "ruleGroup", "title", "condition", "data", "for", "labels"],
+    "properties": {
+        "uid": {"type": "string", "minLength": 1},
+        "orgID": INTEGER,
+        "folderUID": STRING,
+        "ruleGroup": STRING,
+        "title": STRING,
+        "data": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["refId", "datasourceUid", "model"],
+                "properties": {"refId": STRING, "datasourceUid": STRING, "model": {"type": "object"}}
+            }
+        },
+        "for": STRING,
+        "annotations": {
+            "type": "object",
+            "properties": {"message": STRING, "__dashboardUid__": STRING, "__panelId__": STRING}
+        },
+        "labels": {
+            "type": "object",
+            "required": ["rule_uid", "dashboard_uid"],
+            "properties": {"rule_uid": STRING, "dashboard_uid": STRING}
+        }
+    }
+}
+
+POLICY_ROUTE_SCHEMA = {
+    "type": "object",
+    "required": ["receiver", "object_matchers"],
+    "properties": {
+        "receiver": STRING,
+        "object_matchers": {
+            "type": "array",
+            "items": {"type": "array", "minItems": 3, "maxItems": 3, "items": STRING}
+        }
+    }
+}
+
+# Compiled once; checking a bundle does not walk the schemas again.
+DASHBOARD_WRAPPER_VALIDATOR = Draft7Validator(DASHBOARD_WRAPPER_SCHEMA)
+ALERT_RULES_VALIDATOR = Draft7Validator({"type": "array", "items": ALERT_RULE_SCHEMA})
+POLICY_ROUTES_VALIDATOR = Draft7Validator({"type": "array", "items": POLICY_ROUTE_SCHEMA})
+
+
+def schema_errors(validator: Draft7Validator, instance) -> [str]:
+    return [f"{error.json_path}: {error.message}"
+            for error in sorted(validator.iter_errors(instance), key=lambda error: error.json_path)]
+
+
+def rendered_bundle_errors(dashboard_wrapper, alert_rules, notification_policy_routes) -> [str]:
+    """Returns the schema violations of the rendered JSON data of a DashboardBundle."""
+    return schema_errors(DASHBOARD_WRAPPER_VALIDATOR, dashboard_wrapper) + \
+        [f"alert rules {error}" for error in schema_errors(ALERT_RULES_VALIDATOR, alert_rules)] + \
+        [f"policy routes {error}" for error in schema_errors(POLICY_ROUTES_VALIDATOR, notification_policy_routes)]
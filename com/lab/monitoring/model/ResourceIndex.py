@@ -0,0 +1,26 @@
+class ResourceIndex:
+    """Typed Grafana resources (Folder, ContactPoint, ZabbixDatasource, ...) with lookups by uid and by name.
+
+    When several resources share a name (e.g. integrations of one contact point), the name lookup returns the first.
+    """
+
+    def __init__(self, items: list):
+        self.items: list = items
+        self.by_uid: dict = {}
+        self.by_name: dict = {}
+        for item in items:
+            if getattr(item, "uid", None) is not None:
+                self.by_uid.setdefault(item.uid, item)
+            self.by_name.setdefault(item.name, item)
+
+    def get(self, uid):
+        return self.by_uid.get(uid)
+
+    def find_by_name(self, name):
+        return self.by_name.get(name)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,118 @@
+import json
+import os
+import re
+import threading
+
+import attr
+from grafanalib._gen import DashboardEncoder
+
+COMPACT_SEPARATORS = (',', ':')
+
+SCALAR_TYPES = frozenset([str, int, float, bool, type(None)])
+
+
+class FragmentCache:
+    """Shares immutable dashboard fragments (value mappings, overrides, transformations, targets, ...) within a run.
+
+    fragment() builds each distinct fragment once, keyed on its class and complete arguments, and returns the same
+    instance to every dashboard using it; intern() does the same for an already built fragment, keyed on its attribute
+    values. A shared fragment is encoded to compact JSON the first time a dashboard containing it is serialized; later
+    serializations splice that text in instead of encoding the fragment again.
+
+    Shared fragments must never be changed; derive a new one with attr.evolve() instead.
+
+        mappings = [fragment_cache.fragment(StatMappingValue, "0", "DOWN", "red")]
+    """
+
+    def __init__(self):
+        self.instances = {}
+        self.shared = {}
+        self.encoded = []
+        self.lock = threading.Lock()
+        # The encoder writes a placeholder string for each shared fragment, which splice() replaces with its JSON.
+        # The random nonce keeps placeholders apart from any string a dashboard may contain.
+        nonce = os.urandom(8).hex()
+        self.placeholder = f"\x00{nonce}:%d\x00"
+        self.placeholder_pattern = re.compile(r'"\\u0000' + nonce + r':(\d+)\\u0000"')
+
+    def fragment(self, fragment_type, *args, **kwargs):
+        key = argument_key(fragment_type, args, kwargs)
+        instance = self.instances.get(key)
+        if instance is None:
+            instance = self.share(key, fragment_type(*args, **kwargs))
+        return instance
+
+    def intern(self, fragment):
+        return self.share(fragment_key(fragment), fragment)
+
+    def share(self, key, fragment):
+        with self.lock:
+            instance = self.instances.setdefault(key, fragment)
+            self.shared.setdefault(id(instance), [instance, None])
+            return instance
+
+    def is_shared(self, obj) -> bool:
+        entry = self.shared.get(id(obj))
+        return entry is not None and entry[0] is obj
+
+    def placeholder_of(self, fragment) -> str:
+        entry = self.shared[id(fragment)]
+        if entry[1] is None:
+            encoded = self.splice(json.dumps(fragment.to_json_data(), sort_keys=True, separators=COMPACT_SEPARATORS,
+                                             cls=FragmentEncoder))
+            with self.lock:
+                if entry[1] is None:
+                    self.encoded.append(encoded)
+                    entry[1] = len(self.encoded) - 1
+        return self.placeholder % entry[1]
+
+    def splice(self, text: str) -> str:
+        if not self.encoded:
+            return text
+        return self.placeholder_pattern.sub(lambda match: self.encoded[int(match.group(1))], text)
+
+    def clear(self):
+        with self.lock:
+            self.instances.clear()
+            self.shared.clear()
+            self.encoded.clear()
+
+    def stats(self) -> dict:
+        return {"fragments": len(self.shared), "encoded": len(self.encoded),
+                "encoded_bytes": sum(len(encoded) for encoded in self.encoded)}
+
+
+def argument_key(fragment_type, args, kwargs):
+    return fragment_type, fragment_key(args), fragment_key(kwargs) if kwargs else None
+
+
+def fragment_key(obj):
+    """Hashable key of the complete value of obj, raising TypeError for values that cannot be keyed."""
+    obj_type = type(obj)
+    if obj_type in SCALAR_TYPES:
+        # The type keeps values like 1, 1.0 and True apart, which are equal in Python but not in JSON.
+        return obj_type, obj
+    if obj_type is tuple or obj_type is list:
+        return (obj_type,) + tuple(fragment_key(value) for value in obj)
+    if obj_type is dict:
+        return dict, tuple((key, fragment_key(value)) for key, value in sorted(obj.items()))
+    if fragment_cache.is_shared(obj):
+        # A shared fragment is the only instance of its value.
+        return "shared", id(obj)
+    if attr.has(obj_type):
+        return (obj_type,) + tuple(fragment_key(getattr(obj, field.name)) for field in attr.fields(obj_type))
+    hash(obj)
+    return obj_type, obj
+
+
+class FragmentEncoder(DashboardEncoder):
+    """DashboardEncoder that writes placeholders for shared fragments, to be replaced by FragmentCache.splice()."""
+
+    def default(self, obj):
+        if fragment_cache.is_shared(obj):
+            return fragment_cache.placeholder_of(obj)
+        return DashboardEncoder.default(self, obj)
+
+
+# Fragments of the current process, shared by all dashboards of the run.
+fragment_cache = FragmentCache()
@@ -0,0 +1,231 @@
+import codecs
+import gzip
+import hashlib
+import json
+import zlib
+
+from grafanalib._gen import DashboardEncoder
+
+from com.lab.monitoring.util.FragmentCache import FragmentEncoder, fragment_cache, COMPACT_SEPARATORS
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# zlib window bits that produce a gzip header and trailer, as gzip.compress does.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+JSON_WHITESPACE = " \t\n\r"
+JSON_DELIMITERS = JSON_WHITESPACE + ",:]}"
+
+
+def to_json_data(obj, pretty=False) -> str:
+    """Serializes obj with a deterministic key order.
+
+    The compact form is used on the wire and for hashing, pretty=True is meant for debug dumps only. Shared fragments
+    of the fragment cache are spliced into the compact form from their encoded JSON.
+    """
+    if pretty:
+        return json.dumps(obj, sort_keys=True, indent=2, cls=DashboardEncoder)
+    return fragment_cache.splice(json.dumps(obj, sort_keys=True, separators=COMPACT_SEPARATORS, cls=FragmentEncoder))
+
+
+def from_json_data(content: bytes):
+    return json.loads(content.decode('utf8'))
+
+
+def to_canonical_json(obj) -> str:
+    return to_json_data(obj)
+
+
+def content_hash(obj) -> str:
+    return hashlib.sha256(to_canonical_json(obj).encode('utf8')).hexdigest()
+
+
+def is_subset(expected, actual) -> bool:
+    """True when every non-null value of expected is present with the same value in actual.
+
+    Used to compare rendered objects with their stored versions, to which Grafana adds server-side fields.
+    """
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(key in actual and is_subset(value, actual[key])
+                                                for key, value in expected.items() if value is not None)
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and \
+            all(is_subset(e, a) for e, a in zip(expected, actual))
+    return expected == actual
+
+
+def encode_request_body(json_data, gzip_threshold: int):
+    """Returns the request body bytes and extra headers, gzipping bodies of at least gzip_threshold bytes.
+
+    A gzip_threshold of 0 or less disables compression.
+    """
+    if json_data is None:
+        return None, {}
+    body = json_data.encode('utf8') if isinstance(json_data, str) else json_data
+    if 0 < gzip_threshold <= len(body):
+        return gzip.compress(body, compresslevel=6), {'Content-Encoding': 'gzip'}
+    return body, {}
+
+
+def iter_json_data(obj, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yields the compact JSON of obj as utf8 chunks of about chunk_size bytes, identical to to_json_data(obj).
+
+    The encoder walks the to_json_data() tree lazily, so the complete document is never held in memory at once.
+    """
+    encoder = FragmentEncoder(sort_keys=True, separators=COMPACT_SEPARATORS)
+    pieces = []
+    size = 0
+    for piece in encoder.iterencode(obj):
+        # Placeholders of shared fragments are always yielded as one piece by the encoder.
+        piece = fragment_cache.splice(piece).encode('utf8')
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(pieces)
+            pieces = []
+            size = 0
+    if pieces:
+        yield b"".join(pieces)
+
+
+class StreamedBody:
+    """Request body that encodes obj while it is sent, with chunked transfer encoding.
+
+    Iterating it again encodes obj again, so the request can be replayed on retry. With gzip, the chunks are compressed
+    on the fly. bytes_sent counts the bytes of the last iteration.
+    """
+
+    def __init__(self, obj, gzip_enabled: bool = False, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.obj = obj
+        self.gzip_enabled = gzip_enabled
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+
+    @property
+    def headers(self) -> dict:
+        return {'Content-Encoding': 'gzip'} if self.gzip_enabled else {}
+
+    def __iter__(self):
+        self.bytes_sent = 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS) if self.gzip_enabled else None
+        for chunk in iter_json_data(self.obj, self.chunk_size):
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            self.bytes_sent += len(chunk)
+            yield chunk
+        if compressor is not None:
+            chunk = compressor.flush()
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+
+class JsonStreamReader:
+    """Parses a JSON document from an iterable of byte chunks while they arrive.
+
+    The elements of arrays in the top two levels and the members of a top-level object are decoded one at a time, so
+    only the text of the element being decoded is buffered instead of the whole response. Large list responses
+    (datasources, folders, alert rules) and the routes of the notification policy tree are parsed this way.
+    """
+
+    def __init__(self, chunks, stream_depth: int = 2):
+        self.chunks = iter(chunks)
+        self.stream_depth = stream_depth
+        self.text_decoder = codecs.getincrementaldecoder('utf8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self, min_chars: int = 1) -> bool:
+        """Appends at least min_chars characters to the unparsed buffer, returns False at the end of the input."""
+        pieces = [self.buffer[self.position:]]
+        added = 0
+        while added < min_chars and not self.exhausted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                piece = self.text_decoder.decode(b"", final=True)
+            else:
+                piece = self.text_decoder.decode(chunk)
+            pieces.append(piece)
+            added += len(piece)
+        self.buffer = "".join(pieces)
+        self.position = 0
+        return added > 0
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in JSON_WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def expect(self, char):
+        found = self.peek()
+        if found is None:
+            raise ValueError(f"Unexpected end of the JSON stream, expected '{char}'")
+        if found != char:
+            raise ValueError(f"Expected '{char}' at position {self.position} of the JSON stream")
+        self.position += 1
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+                # A number cut off at the end of the buffer ("12" of "12.5") decodes too, so the value is complete only
+                # when a delimiter follows it.
+                if self.exhausted or (end < len(self.buffer) and self.buffer[end] in JSON_DELIMITERS):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            # Grow the buffer geometrically, so a large value is decoded a logarithmic number of times.
+            self.fill(max(len(self.buffer) - self.position, STREAM_CHUNK_SIZE))
+
+    def read(self, depth: int = 0):
+        char = self.peek()
+        if depth >= self.stream_depth or char not in ('[', '{'):
+            return self.decode_value()
+        if char == '[':
+            return list(self.iter_array(depth))
+        return dict(self.iter_object(depth))
+
+    def iter_array(self, depth: int = 0):
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self.peek() == ']':
+                self.position += 1
+                return
+            self.expect(',')
+
+    def iter_object(self, depth: int = 0):
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(':')
+            yield key, self.read(depth + 1)
+            if self.peek() == '}':
+                self.position += 1
+                return
+            self.expect(',')
+
+
+def load_json_stream(chunks):
+    reader = JsonStreamReader(chunks)
+    value = reader.read()
+    if reader.peek() is not None:
+        raise ValueError(f"Extra data at position {reader.position} of the JSON stream")
+    return value
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from os import getenv
+
+import attr
+
+
+def trusted_models_from_env() -> bool:
+    return getenv("TRUSTED_MODELS", "False").lower() == "true"
+
+
+def apply_model_validation_from_env() -> bool:
+    """Disables the attrs validators of all model classes, ours and grafanalib's, when TRUSTED_MODELS is True.
+
+    Validation is process-wide, so every process building dashboards calls this once before building. Trusted runs are
+    only safe for builders whose output the CI model check (check_models.py) validated, which builds them with
+    validators and checks the rendered JSON against the schemas of RenderedSchema.
+    """
+    trusted = trusted_models_from_env()
+    attr.validators.set_disabled(trusted)
+    return trusted
+
+
+@contextmanager
+def model_validation(enabled: bool):
+    """Runs the block with the attrs validators enabled or disabled, restoring the previous setting on exit."""
+    previous = attr.validators.get_disabled()
+    attr.validators.set_disabled(not enabled)
+    try:
+        yield
+    finally:
+        attr.validators.set_disabled(previous)
@@ -1,3 +1,7 @@
+import json
+import logging
+import os
+import sys
 import time
 from enum import IntEnum
 from os import getenv
@@ -13,24 +17,91 @@ class LogLevel(IntEnum):
     DEBUG = 3
 
 
-LOG_LEVEL = LogLevel.DEBUG
+LOGGING_LEVELS = {
+    LogLevel.ERROR: logging.ERROR,
+    LogLevel.INFO: logging.INFO,
+    LogLevel.DEBUG: logging.DEBUG
+}
 
 
-def log_debug(text):
-    log(text, LogLevel.DEBUG)
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "time": time.strftime(DATE_TIME_FORMAT, time.localtime(record.created)),
+            "level": record.levelname,
+            "message": record.getMessage()
+        })
 
 
-def log_info(text):
-    log(text, LogLevel.INFO)
+def parse_log_level(value) -> LogLevel:
+    try:
+        return LogLevel[value.upper()]
+    except KeyError:
+        allowed = ", ".join(level.name for level in LogLevel)
+        raise ProvisioningException(f"Environment Variable 'LOG_LEVEL' must be one of [{allowed}], got '{value}'")
 
 
-def log_error(text):
-    log(text, LogLevel.ERROR)
+def create_logger(level: LogLevel, log_format: str) -> logging.Logger:
+    handler = logging.StreamHandler(sys.stdout)
+    if log_format.lower() == "json":
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s - %(message)s", DATE_TIME_FORMAT))
+    logger = logging.getLogger("grafana_dashboards")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(LOGGING_LEVELS[level])
+    return logger
 
 
-def log(text, level: LogLevel):
+LOG_LEVEL = parse_log_level(getenv("LOG_LEVEL", LogLevel.INFO.name))
+
+LOGGER = create_logger(LOG_LEVEL, getenv("LOG_FORMAT", "text"))
+
+
+def log_debug(text, *args):
+    log(text, LogLevel.DEBUG, *args)
+
+
+def log_info(text, *args):
+    log(text, LogLevel.INFO, *args)
+
+
+def log_error(text, *args):
+    log(text, LogLevel.ERROR, *args)
+
+
+def is_log_enabled(level: LogLevel) -> bool:
+    return level <= LOG_LEVEL
+
+
+def log(text, level: LogLevel, *args):
+    """Logs text, %-formatted with args only when the level is enabled.
+
+    Pass expensive values as args rather than in an f-string, so disabled levels cost a single comparison.
+    """
     if level <= LOG_LEVEL:
-        print(f"[{time.strftime(DATE_TIME_FORMAT)}] {level.name} - {text}")
+        LOGGER.log(LOGGING_LEVELS[level], text, *args)
+
+
+class BodySummary:
+    """Lazily truncated request or response body, rendered only when the log message is emitted."""
+
+    def __init__(self, content, limit: int = None):
+        self.content = content
+        self.limit = limit if limit is not None else LOG_BODY_LIMIT
+
+    def __str__(self):
+        content = self.content or b""
+        if isinstance(content, str):
+            content = content.encode("utf8")
+        if 0 < self.limit < len(content):
+            return f"{content[:self.limit].decode('utf8', errors='replace')}... ({len(content)} bytes)"
+        return content.decode("utf8", errors="replace")
+
+
+def summarize_body(content, limit: int = None) -> BodySummary:
+    return BodySummary(content, limit)
 
 
 def default_if_none(value, default_value):
@@ -45,8 +116,52 @@ def query_by_elasticsearch(elasticsearch_name):
     return f"{elasticsearch_name}-{elasticsearch_name}.*"
 
 
+def target_path(path, target_name):
+    """Returns the variant of a state file or directory path for one Grafana target, e.g. .dashboard-state.prod.json."""
+    if path is None or target_name is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{target_name}{extension}"
+
+
 def require_env(var_name):
     value = getenv(var_name)
     if value is None:
         raise ProvisioningException(f"Environment Variable '{var_name}' is not specified")
     return value
+
+
+def get_env_int(var_name, default_value: int) -> int:
+    value = getenv(var_name)
+    if value is None:
+        return default_value
+    try:
+        return int(value)
+    except ValueError:
+        raise ProvisioningException(f"Environment Variable '{var_name}' must be an integer, got '{value}'")
+
+
+def get_env_enum(var_name, enum_type, default_value):
+    value = getenv(var_name)
+    if value is None:
+        return default_value
+    try:
+        return enum_type(value.lower())
+    except ValueError:
+        allowed = ", ".join(member.value for member in enum_type)
+        raise ProvisioningException(f"Environment Variable '{var_name}' must be one of [{allowed}], got '{value}'")
+
+
+def get_env_float(var_name, default_value: float) -> float:
+    value = getenv(var_name)
+    if value is None:
+        return default_value
+    try:
+        return float(value)
+    except ValueError:
+        raise ProvisioningException(f"Environment Variable '{var_name}' must be a number, got '{value}'")
+
+
+# Response bodies are truncated to this many bytes in log messages, 0 logs them in full. Read once get_env_int is
+# defined, so a malformed value raises a ProvisioningException like the other settings.
+LOG_BODY_LIMIT = get_env_int("LOG_BODY_LIMIT", 512)
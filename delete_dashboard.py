@@ -1,10 +1,20 @@
-from com.kn.monitoring.GrafanaClient import GrafanaClient
-from com.kn.monitoring.util.Util import log_info, require_env
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.RunJournal import RunJournal
+from com.lab.monitoring.RunMetrics import run_metrics
+from com.lab.monitoring.util.Util import log_info, require_env
 
 dashboard_uid = require_env("DASHBOARD_UID")
 
 log_info(f"Deleting Dashboard, its alert rules and notification policies by uid: {dashboard_uid}]")
-client = GrafanaClient()
-client.delete_policies_and_alert_rules_by_dashboard_uid(dashboard_uid)
-client.delete_dashboard(dashboard_uid)
+journal = RunJournal.from_env(f"delete:{dashboard_uid}")
+try:
+    with GrafanaClient(journal=journal) as client:
+        client.delete_policies_and_alert_rules_by_dashboard_uid(dashboard_uid)
+        client.delete_dashboard(dashboard_uid)
+    if journal is not None:
+        journal.complete()
+finally:
+    if journal is not None:
+        journal.close()
+    run_metrics.write_reports_from_env()
 log_info(f"Dashboard deleted successfully")
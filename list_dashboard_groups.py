@@ -0,0 +1,5 @@
+from com.lab.monitoring.DashboardGroups import registered_groups
+
+# Reads the registry only, no group module is imported.
+for group_name, module_name in sorted(registered_groups().items()):
+    print(f"{group_name}\t{module_name}")
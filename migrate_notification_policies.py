@@ -0,0 +1,10 @@
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.model.NotificationPolicyTree import PolicyLayout
+from com.lab.monitoring.util.Util import log_info, get_env_enum
+
+layout = get_env_enum("NOTIFICATION_POLICY_LAYOUT", PolicyLayout, PolicyLayout.NESTED)
+
+log_info(f"Migrating notification policies to the {layout.value} layout")
+client = GrafanaClient(policy_layout=layout)
+client.migrate_notification_policies(layout)
+log_info(f"Notification policies migrated successfully")
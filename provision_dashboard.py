@@ -1,10 +1,203 @@
-dashboard_group = require_env("DASHBOARD_GROUP")
-
-log_info(f"Provisioning Dashboards for group {dashboard_group}")
-functions = {
-    "PRJ01": provision_prj01_dashboards,
-    "PRJ02": provision_prj02_dashboards,
-    "PRJ03": provision_prj03_dashboards
-}
-functions[dashboard_group]()
-log_info(f"Dashboard provisioned successfully")
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from os import getenv
+
+from com.lab.monitoring.ChangeDetector import ChangeDetector
+from com.lab.monitoring.DashboardGroups import group_names, group_builders, build_dashboards
+from com.lab.monitoring.DashboardProvisioner import DashboardProvisioner, ProvisioningStatus, print_summary
+from com.lab.monitoring.DashboardRenderer import DashboardRenderer
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.GrafanaTarget import GrafanaTarget, targets_from_env
+from com.lab.monitoring.RunJournal import RunJournal
+from com.lab.monitoring.RunMetrics import run_metrics
+from com.lab.monitoring.SourceTracker import SourceTracker, inputs_hash
+from com.lab.monitoring.SourceWatcher import SourceWatcher, restart_modules
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.model.RenderedBundle import render_bundle
+from com.lab.monitoring.util.ModelValidation import apply_model_validation_from_env
+from com.lab.monitoring.util.FragmentCache import fragment_cache
+from com.lab.monitoring.util.Util import log_info, log_error, require_env, get_env_int, get_env_float
+
+
+def provision(dashboard_group):
+    log_info(f"Provisioning Dashboards for group {dashboard_group}")
+    journal = RunJournal.from_env(f"provision:{dashboard_group}")
+    try:
+        with GrafanaClient(journal=journal) as client:
+            provisioner = DashboardProvisioner(client, change_detector=ChangeDetector.from_env(client))
+            source_tracker = SourceTracker.from_env(client)
+            for group_name in group_names(dashboard_group):
+                provision_group(client, provisioner, group_name, source_tracker)
+        if journal is not None:
+            journal.complete()
+    finally:
+        if journal is not None:
+            journal.close()
+        run_metrics.write_reports_from_env()
+    log_info(f"Dashboard provisioned successfully")
+
+
+def provision_targets(dashboard_group, targets: [GrafanaTarget]):
+    """Builds and renders every dashboard group once and provisions it to all targets concurrently.
+
+    Each target has its own client, change detection, source state, run journal, metrics and results; a failing target
+    does not stop the others.
+    """
+    log_info(f"Provisioning Dashboards for group {dashboard_group} to {len(targets)} Grafana targets")
+    failed_targets = set()
+    with ExitStack() as stack, ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        clients = [stack.enter_context(target.create_client(f"provision:{dashboard_group}")) for target in targets]
+        provisioners = [DashboardProvisioner(client, change_detector=ChangeDetector.from_env(client, target.name))
+                        for target, client in zip(targets, clients)]
+        source_trackers = list(executor.map(SourceTracker.from_env, clients, [target.name for target in targets]))
+        try:
+            for group_name in group_names(dashboard_group):
+                builders = group_builders(group_name)
+                selected = [changed_builders(group_name, builders, tracker) for tracker in source_trackers]
+                needed = [builder for builder in builders if any(builder in chosen for chosen in selected)]
+                rendered = dict(zip(needed, [render_bundle(bundle) for bundle in build_dashboards(needed)]))
+                futures = {}
+                for target, client, provisioner, source_tracker, chosen in zip(targets, clients, provisioners,
+                                                                               source_trackers, selected):
+                    if target.name in failed_targets:
+                        continue
+                    built = [(builder, target.rewrite_bundle(rendered[builder])) for builder in chosen]
+                    futures[executor.submit(provision_bundles, client, provisioner, group_name, built, source_tracker,
+                                            target.name)] = target
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        log_error(f"Provisioning group {group_name} to target {futures[future].name} failed: {e}")
+                        failed_targets.add(futures[future].name)
+            for target, client in zip(targets, clients):
+                if client.journal is not None and target.name not in failed_targets:
+                    client.journal.complete()
+        finally:
+            for target, client in zip(targets, clients):
+                if client.journal is not None:
+                    client.journal.close()
+                client.metrics.write_reports_from_env(target.name)
+            run_metrics.write_reports_from_env()
+    if failed_targets:
+        raise ProvisioningException(f"{len(failed_targets)} of {len(targets)} Grafana targets failed to provision: "
+                                    f"{', '.join(sorted(failed_targets))}")
+    log_info(f"Dashboard provisioned successfully to {len(targets)} Grafana targets")
+
+
+def provision_group(client: GrafanaClient, provisioner: DashboardProvisioner, group_name,
+                    source_tracker: SourceTracker = None):
+    builders = changed_builders(group_name, group_builders(group_name), source_tracker)
+    provision_bundles(client, provisioner, group_name, list(zip(builders, build_dashboards(builders))),
+                      source_tracker)
+
+
+def changed_builders(group_name, builders, source_tracker: SourceTracker = None) -> list:
+    if source_tracker is None:
+        return builders
+    source_tracker.retain_builders(group_name, builders)
+    return source_tracker.changed_builders(group_name, builders)
+
+
+def provision_bundles(client: GrafanaClient, provisioner: DashboardProvisioner, group_name, built: list,
+                      source_tracker: SourceTracker = None, target_name=None):
+    """Uploads the (builder, bundle) pairs of a group, then their alert rules and policy routes."""
+    results = provisioner.provision([bundle.dashboard_wrapper for _, bundle in built])
+    print_summary(results, target_name)
+    failed_uids = {result.uid for result in results if result.status == ProvisioningStatus.FAILED}
+    provisioned = [(builder, bundle) for builder, bundle in built if bundle.uid not in failed_uids]
+
+    if getenv("ALERT_RULES_PROVISIONING_ENABLED", "False").lower() == "true":
+        # The bundles hold all rules and routes of their dashboards; the ones provisioned before and no longer built,
+        # e.g. after a rule was renamed, are removed.
+        dashboard_uids = [bundle.uid for _, bundle in provisioned]
+        client.add_alert_rules([alert_rule for _, bundle in provisioned for alert_rule in bundle.alert_rules],
+                               dashboard_uids)
+        routes = [route for _, bundle in provisioned for route in bundle.notification_policy_routes]
+        routes_hash = client.step_inputs([routes, dashboard_uids])
+        if client.is_step_done("policies", group_name, routes_hash):
+            log_info(f"Notification policies already updated by the interrupted run, skipping")
+        else:
+            with client.notification_policies() as tree:
+                tree.upsert_routes(routes)
+                tree.remove_unlisted_routes(dashboard_uids, routes)
+            client.record_step("policies", group_name, routes_hash)
+
+    if source_tracker is not None:
+        for builder, bundle in provisioned:
+            source_tracker.mark_built(group_name, builder, bundle)
+        source_tracker.save_state()
+    if failed_uids:
+        raise ProvisioningException(f"{len(failed_uids)} of {len(results)} dashboards failed to provision")
+
+
+def watch(dashboard_group):
+    """Provisions the group, then keeps provisioning the dashboards whose sources change until interrupted.
+
+    The client, its connection pool and metadata cache, and the imported modules stay warm between changes; a change
+    reloads the changed modules and rebuilds only the dashboards whose builders depend on them.
+    """
+    names = group_names(dashboard_group)
+    interval = get_env_float("WATCH_INTERVAL", 1.0)
+    with GrafanaClient() as client:
+        provisioner = DashboardProvisioner(client, change_detector=ChangeDetector.from_env(client))
+        source_tracker = SourceTracker.create(client)
+        watcher = SourceWatcher(names, source_tracker, get_env_float("WATCH_DEBOUNCE", 0.2))
+        log_info(f"Watching {len(watcher.modules)} modules of group {dashboard_group}, press Ctrl+C to stop")
+        changed = None
+        try:
+            while True:
+                if changed is None or changed:
+                    provision_changes(client, provisioner, names, source_tracker, watcher, changed)
+                time.sleep(interval)
+                changed = watcher.changed_modules()
+                restart = restart_modules(changed)
+                if restart:
+                    raise ProvisioningException(f"Changed modules {', '.join(restart)} cannot be reloaded, "
+                                                f"restart watch mode")
+        except KeyboardInterrupt:
+            log_info("Watch mode stopped")
+        finally:
+            run_metrics.write_reports_from_env()
+
+
+def provision_changes(client: GrafanaClient, provisioner: DashboardProvisioner, names: [str],
+                      source_tracker: SourceTracker, watcher: SourceWatcher, changed: [str] = None):
+    """Reloads the changed modules and provisions the affected dashboards, logging errors instead of raising them."""
+    start = time.monotonic()
+    try:
+        if changed:
+            watcher.reload(changed)
+        fragment_cache.clear()
+        source_tracker.inputs_hash = inputs_hash(client)
+        for group_name in names:
+            provision_group(client, provisioner, group_name, source_tracker)
+        log_info(f"Changes provisioned in {time.monotonic() - start:.2f}s, watching for changes")
+    except Exception as e:
+        log_error(f"Provisioning changes failed, fix the sources and save again: {e}")
+
+
+def render(dashboard_group, output_dir):
+    log_info(f"Rendering Dashboards for group {dashboard_group} to {output_dir}")
+    renderer = DashboardRenderer(output_dir, get_env_int("RENDER_WORKERS", os.cpu_count()))
+    renderer.render(group_names(dashboard_group))
+    log_info(f"Dashboards rendered successfully")
+
+
+if __name__ == "__main__":
+    dashboard_group = require_env("DASHBOARD_GROUP")
+    render_output_dir = getenv("RENDER_OUTPUT_DIR")
+    grafana_targets = targets_from_env()
+    if apply_model_validation_from_env():
+        log_info("Trusted models: attrs validation is disabled")
+
+    if render_output_dir is not None:
+        render(dashboard_group, render_output_dir)
+    elif getenv("WATCH_MODE", "False").lower() == "true":
+        watch(dashboard_group)
+    elif grafana_targets is not None:
+        provision_targets(dashboard_group, grafana_targets)
+    else:
+        provision(dashboard_group)
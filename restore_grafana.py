@@ -0,0 +1,10 @@
+from com.lab.monitoring.GrafanaBackup import GrafanaBackup
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.util.Util import log_info, require_env, get_env_int
+
+backup_file = require_env("BACKUP_FILE")
+
+log_info(f"Restoring Grafana dashboards and alerting configuration from {backup_file}")
+with GrafanaClient() as client:
+    GrafanaBackup(client, get_env_int("BACKUP_WORKERS", 8), get_env_int("BACKUP_PAGE_SIZE", 1000)).restore(backup_file)
+log_info(f"Restore completed successfully")
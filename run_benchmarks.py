@@ -0,0 +1,23 @@
+from os import getenv
+
+from com.lab.monitoring.benchmark.Benchmarks import run_suite, save_results, compare_results
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+from com.lab.monitoring.util.Util import log_info, get_env_int, get_env_float
+
+panel_sizes = [int(size) for size in getenv("BENCHMARK_PANELS", "10,100,1000").split(",")]
+output_file = getenv("BENCHMARK_OUTPUT", "benchmark-results.json")
+baseline_file = getenv("BENCHMARK_BASELINE")
+
+results = run_suite(panel_sizes,
+                    get_env_int("BENCHMARK_DASHBOARDS", 20),
+                    get_env_float("BENCHMARK_LATENCY", 0.02),
+                    get_env_float("BENCHMARK_ERROR_RATE", 0.0),
+                    get_env_int("PROVISIONING_WORKERS", 8),
+                    get_env_int("BENCHMARK_REPEATS", 5))
+save_results(output_file, results)
+
+if baseline_file is not None:
+    regressions = compare_results(baseline_file, results, get_env_float("BENCHMARK_TOLERANCE", 0.1))
+    if regressions:
+        raise ProvisioningException(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+    log_info("No benchmark regressions")
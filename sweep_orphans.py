@@ -0,0 +1,13 @@
+from os import getenv
+
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.OrphanSweeper import OrphanSweeper
+from com.lab.monitoring.util.Util import log_info, get_env_int
+
+dry_run = getenv("ORPHAN_SWEEP_DRY_RUN", "False").lower() == "true"
+
+log_info(f"Sweeping orphan alert rules and notification policy routes{' (dry run)' if dry_run else ''}")
+with GrafanaClient() as client:
+    result = OrphanSweeper(client, get_env_int("ORPHAN_SWEEP_WORKERS", 8), dry_run).sweep()
+log_info(f"Sweep completed successfully: {len(result.alert_rule_uids)} alert rules in {result.rule_groups} rule groups "
+         f"and {len(result.route_rule_uids)} notification policy routes {'found' if dry_run else 'deleted'}")
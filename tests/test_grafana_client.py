@@ -0,0 +1,39 @@
+import pytest
+import requests
+
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.MetadataCache import MetadataCache
+from com.lab.monitoring.RequestScheduler import RequestScheduler
+from com.lab.monitoring.RunMetrics import RunMetrics
+from com.lab.monitoring.benchmark.StubGrafanaServer import StubGrafanaServer
+from com.lab.monitoring.exception.provisioning_exception import ProvisioningException
+
+
+@pytest.fixture
+def forbidden_client():
+    with StubGrafanaServer() as server:
+        server.handle = lambda method, path, body, query=None: (403, {"message": "Permission denied"}, {})
+        with GrafanaClient(server.url, "test", metadata_cache=MetadataCache(), metrics=RunMetrics()) as client:
+            yield client
+
+
+@pytest.mark.parametrize("operation, message", [
+    (lambda client: client.find_alert_rules(), "Alert rules fetching failed"),
+    (lambda client: client.delete_alert_rules(["rule"]), "Alert rules fetching failed"),
+    (lambda client: client.get_notification_policies(), "Notification policies fetching failed"),
+    (lambda client: client.add_notification_policy_routes([]), "Notification policies fetching failed"),
+])
+def test_failed_fetches_raise_provisioning_exceptions(forbidden_client, operation, message):
+    with pytest.raises(ProvisioningException, match=message):
+        operation(forbidden_client)
+
+
+@pytest.mark.parametrize("method", ["POST", "PUT"])
+def test_requests_are_retried_when_the_connection_cannot_be_established(method):
+    scheduler = RequestScheduler(max_concurrency=2, adaptive=False)
+    with GrafanaClient("http://127.0.0.1:1", "test", max_retries=2, backoff_factor=0, scheduler=scheduler,
+                       metadata_cache=MetadataCache(), metrics=RunMetrics()) as client:
+        with pytest.raises(requests.ConnectionError):
+            client.request(method, "api/dashboards/db", "{}")
+
+    assert scheduler.overloads == 3
@@ -0,0 +1,79 @@
+import json
+
+import attr
+import pytest
+
+from com.lab.grafanalib.core import RowPanel
+from com.lab.monitoring.ModelCheck import check_builder, render
+from com.lab.monitoring.benchmark.DashboardGenerator import generate_dashboard
+from com.lab.monitoring.model.RenderedSchema import rendered_bundle_errors
+from com.lab.monitoring.util.ModelValidation import model_validation
+
+
+def benchmark_builder(panel_count, alert_ratio=0.1):
+    def build():
+        return generate_dashboard(f"check-{panel_count}", panel_count, alert_ratio)
+
+    return build
+
+
+def invalid_row_builder():
+    bundle = generate_dashboard("check-invalid", 12)
+    bundle.dashboard_wrapper.dashboard.panels.append(RowPanel(title=1))
+    return bundle
+
+
+@pytest.mark.parametrize("panel_count, alert_ratio, alert_count",
+                         [(1, 1.0, 1), (12, 0.1, 2), (250, 0.1, 25), (40, 0, 0)])
+def test_generated_dashboards_render_the_same_valid_json_with_and_without_validation(panel_count, alert_ratio,
+                                                                                     alert_count):
+    with model_validation(True):
+        _, validated = render(benchmark_builder(panel_count, alert_ratio))
+    with model_validation(False):
+        _, trusted = render(benchmark_builder(panel_count, alert_ratio))
+
+    assert validated == trusted
+    assert rendered_bundle_errors(*[json.loads(rendered) for rendered in validated]) == []
+    dashboard_wrapper, alert_rules, routes = [json.loads(rendered) for rendered in validated]
+    assert sum(len(row["panels"]) for row in dashboard_wrapper["dashboard"]["panels"]) == panel_count
+    assert len(alert_rules) == len(routes) == alert_count
+
+
+def test_check_builder_passes_generated_dashboards():
+    result = check_builder(benchmark_builder(60))
+
+    assert result.errors == []
+    assert attr.validators.get_disabled() is False
+
+
+def test_validators_reject_what_the_schema_rejects_in_trusted_builds():
+    with model_validation(True), pytest.raises(TypeError):
+        invalid_row_builder()
+
+    with model_validation(False):
+        _, trusted = render(invalid_row_builder)
+
+    errors = rendered_bundle_errors(*[json.loads(rendered) for rendered in trusted])
+    assert errors == ["$.dashboard.panels[1].title: 1 is not of type 'string'"]
+
+
+def test_check_builder_reports_builds_rendering_differently():
+    builds = iter([benchmark_builder(12)(), benchmark_builder(13)()])
+
+    result = check_builder(lambda: next(builds))
+
+    assert "dashboard render differently without validation" in result.errors
+
+
+def test_schema_rejects_malformed_alert_rules_and_routes():
+    _, rendered = render(benchmark_builder(1, 1.0))
+    dashboard_wrapper, alert_rules, routes = [json.loads(data) for data in rendered]
+    del alert_rules[0]["labels"]["dashboard_uid"]
+    alert_rules[0]["data"] = []
+    routes[0]["object_matchers"][0] = ["rule_uid", "="]
+
+    assert rendered_bundle_errors(dashboard_wrapper, alert_rules, routes) == [
+        "alert rules $[0].data: [] is too short",
+        "alert rules $[0].labels: 'dashboard_uid' is a required property",
+        "policy routes $[0].object_matchers[0]: ['rule_uid', '='] is too short"
+    ]
@@ -0,0 +1,18 @@
+from com.lab.monitoring.RunJournal import RunJournal
+
+
+def test_resumed_journal_with_a_torn_last_line_keeps_the_steps_recorded_after_it(tmp_path):
+    journal_file = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(journal_file, "provision:test").open()
+    journal.record("dashboard", "a", "hash-a")
+    journal.close()
+    with open(journal_file, "a", encoding="utf8") as f:
+        f.write('{"inputs": "hash-b", "key": "b", "st')
+
+    resumed = RunJournal(journal_file, "provision:test").open()
+    resumed.record("dashboard", "c", "hash-c")
+    resumed.close()
+
+    steps = RunJournal(journal_file, "provision:test").load_steps()
+    assert sorted(steps) == [("dashboard", "a"), ("dashboard", "c")]
+    assert steps[("dashboard", "c")]["inputs"] == "hash-c"
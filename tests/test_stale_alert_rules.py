@@ -0,0 +1,83 @@
+import pytest
+
+from com.lab.grafanalib.core import NotificationPolicyRoute
+from com.lab.monitoring.DashboardProvisioner import DashboardProvisioner
+from com.lab.monitoring.GrafanaClient import GrafanaClient
+from com.lab.monitoring.MetadataCache import MetadataCache
+from com.lab.monitoring.RunMetrics import RunMetrics
+from com.lab.monitoring.benchmark.DashboardGenerator import generate_dashboard
+from com.lab.monitoring.benchmark.StubGrafanaServer import StubGrafanaServer
+from com.lab.monitoring.model.NotificationPolicyTree import NotificationPolicyTree
+from provision_dashboard import provision_bundles
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("ALERT_RULES_PROVISIONING_ENABLED", "True")
+    with StubGrafanaServer() as server:
+        yield server
+
+
+def provision(server, bundles):
+    with GrafanaClient(server.url, "test", metadata_cache=MetadataCache(), metrics=RunMetrics()) as client:
+        provision_bundles(client, DashboardProvisioner(client), "TEST", [(None, bundle) for bundle in bundles])
+
+
+def dashboard(uid, renamed_panels=()):
+    """A dashboard with an alert rule on each of its 10 panels, the rules of renamed_panels with another title."""
+    bundle = generate_dashboard(uid, 10, alert_ratio=1.0)
+    for alert_rule in bundle.alert_rules:
+        if int(alert_rule.panelUid) in renamed_panels:
+            alert_rule.title = f"Stat {alert_rule.panelUid} far too high"
+            alert_rule.uid = None
+    bundle.notification_policy_routes = [NotificationPolicyRoute(receiver="default", rule_uid=alert_rule.get_uid(),
+                                                                 dashboard_uid=uid)
+                                         for alert_rule in bundle.alert_rules]
+    return bundle
+
+
+def provisioned_rules(server) -> dict:
+    return {rule["uid"]: rule["title"] for group in server.rule_groups.values() for rule in group["rules"]}
+
+
+def provisioned_routes(server, dashboard_uid) -> [str]:
+    return sorted(NotificationPolicyTree(server.policies).rule_uids(dashboard_uid))
+
+
+def test_renamed_rule_replaces_the_provisioned_rule_and_route(server):
+    original = dashboard("stale-a")
+    provision(server, [original, dashboard("stale-b")])
+    renamed = dashboard("stale-a", renamed_panels={3})
+    old_uid = original.alert_rules[3].get_uid()
+    new_uid = renamed.alert_rules[3].get_uid()
+
+    provision(server, [renamed])
+
+    rules = provisioned_rules(server)
+    assert len(rules) == 20
+    assert old_uid not in rules
+    assert rules[new_uid] == f"[{new_uid}] Stat 3 far too high"
+    assert provisioned_routes(server, "stale-a") == sorted(rule.get_uid() for rule in renamed.alert_rules)
+    assert len(provisioned_routes(server, "stale-b")) == 10
+
+
+def test_rules_removed_from_a_builder_are_removed_with_their_routes(server):
+    provision(server, [dashboard("stale-a"), dashboard("stale-b")])
+    reduced = dashboard("stale-a")
+    reduced.alert_rules = reduced.alert_rules[:4]
+    reduced.notification_policy_routes = reduced.notification_policy_routes[:4]
+
+    provision(server, [reduced])
+
+    assert len(provisioned_rules(server)) == 14
+    assert provisioned_routes(server, "stale-a") == sorted(rule.get_uid() for rule in reduced.alert_rules)
+
+
+def test_rules_of_dashboards_without_alerts_are_removed(server):
+    provision(server, [dashboard("stale-a")])
+
+    provision(server, [generate_dashboard("stale-a", 10, alert_ratio=0)])
+
+    assert provisioned_rules(server) == {}
+    assert server.rule_groups == {}
+    assert provisioned_routes(server, "stale-a") == []